@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+from main_batch import analyse_task
+
+
+class AnalysisServer:
+    def __init__(self, executor: Optional[Executor] = None, workers: int = 4, queue_size: int = 64,
+                 timeout: float = 30., n_best: int = 3, n_worst: int = 3) -> None:
+        """
+        Asyncio server which analyses positions sent by many local clients.
+
+        Every client sends one request per line: a FEN string or a JSON object with "fen" and optional
+        "n_best" and "n_worst" keys, and gets one JSON line in response with the same fields as in
+        main_batch.py output, or with "error" if the request failed.
+
+        :param executor: Executor in which positions are analysed. New process pool with workers processes if None.
+        :param workers: Number of requests analysed at the same time.
+        :param queue_size: Maximal number of requests waiting for analysis. When the queue is full, clients
+         wait for a free place until their timeout.
+        :param timeout: Time in seconds in which every request must be answered.
+        :param n_best: Default number of the best moves in responses.
+        :param n_worst: Default number of the worst moves in responses.
+        """
+        self.executor = executor or ProcessPoolExecutor(workers)
+        self.workers, self.timeout, self.n_best, self.n_worst = workers, timeout, n_best, n_worst
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatchers: list[asyncio.Task] = []
+
+    async def _dispatch(self) -> None:
+        """ Takes requests from the queue and analyses them in the executor. """
+        loop = asyncio.get_running_loop()
+        while True:
+            task, future = await self._queue.get()
+            try:
+                if not future.done():
+                    result = await loop.run_in_executor(self.executor, analyse_task, *task)
+                    if not future.done():
+                        future.set_result(result[0])
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(err)
+            finally:
+                self._queue.task_done()
+
+    def _parse_request(self, line: str) -> tuple:
+        """ Converts request line into arguments of main_batch.analyse_task. """
+        if line.startswith("{"):
+            request = json.loads(line)
+            return ("fen", [request["fen"]]), request.get("n_best", self.n_best), request.get("n_worst", self.n_worst)
+        return ("fen", [line]), self.n_best, self.n_worst
+
+    async def _submit(self, task: tuple) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((task, future))
+        return await future
+
+    async def analyse(self, line: str) -> dict:
+        """ Queues one request and returns its response. """
+        try:
+            task = self._parse_request(line)
+        except (ValueError, KeyError, TypeError):
+            return {"error": "Invalid request."}
+        try:
+            return await asyncio.wait_for(self._submit(task), self.timeout)
+        except asyncio.TimeoutError:
+            return {"fen": task[0][1][0], "error": "Request timed out."}
+        except Exception as err:
+            return {"fen": task[0][1][0], "error": str(err)}
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader) -> Optional[bytes]:
+        """
+        Returns the next line of a client, b"" at the end of the stream or None if the line is longer than
+        the stream limit. The rest of such line is skipped, so the next call returns the line after it.
+        """
+        oversized = False
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as err:
+                line = err.partial
+            except asyncio.LimitOverrunError as err:
+                await reader.readexactly(err.consumed)
+                oversized = True
+                continue
+            return None if oversized else line
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Answers requests of one client connection. """
+        try:
+            while (line := await self._readline(reader)) != b"":
+                try:
+                    line = line.decode().strip() if line is not None else None
+                except UnicodeDecodeError:
+                    line = None
+                if line is None:
+                    response = {"error": "Invalid request."}
+                elif line:
+                    response = await self.analyse(line)
+                else:
+                    continue
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, path: Optional[str] = None) -> asyncio.Server:
+        """
+        Starts dispatchers and a server listening on a Unix socket at path or on host and port if path is None.
+        :return: Started asyncio server.
+        """
+        self._queue = asyncio.Queue(self.queue_size)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self) -> None:
+        """ Stops dispatchers and the executor. """
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8765, path: Optional[str] = None) -> None:
+        """ Starts the server and serves clients until cancelled. """
+        server = await self.start(host, port, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Serves analysis of FEN positions to local clients.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--unix", default=None, help="Path of a Unix socket to listen on instead of TCP.")
+    arg_parser.add_argument("-w", "--workers", type=int, default=4)
+    arg_parser.add_argument("-q", "--queue-size", type=int, default=64)
+    arg_parser.add_argument("-t", "--timeout", type=float, default=30.)
+    args = arg_parser.parse_args()
+
+    analysis_server = AnalysisServer(workers=args.workers, queue_size=args.queue_size, timeout=args.timeout)
+    try:
+        asyncio.run(analysis_server.serve_forever(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
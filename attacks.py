@@ -0,0 +1,202 @@
+from typing import Iterable, Optional, Sequence
+
+from console_chess_imandyr.bot import Bot, Move
+
+from board import CompactBoard, piece_classes, black_flag, first_move_flag
+from move_cache import MoveCostCache, cost_entry
+
+
+pawn, knight, bishop, rook, queen, king = range(1, 7)
+costs = [0] + [cls.cost for cls in piece_classes[1:]] + [0]
+positions = [divmod(square, 8) for square in range(64)]
+
+
+def _targets(deltas: Sequence[tuple[int, int]]) -> list[list[int]]:
+    """ Returns squares reachable from every square by one of the deltas, in the order of deltas. """
+    return [[(row + r) * 8 + column + c for r, c in deltas if 0 <= row + r < 8 and 0 <= column + c < 8]
+            for row, column in positions]
+
+
+def _ray(square: int, r: int, c: int) -> list[int]:
+    """ Returns squares in a direction from a square, from the nearest one. """
+    row, column, ray = *positions[square], []
+    while 0 <= row + r < 8 and 0 <= column + c < 8:
+        row, column = row + r, column + c
+        ray.append(row * 8 + column)
+    return ray
+
+
+# Deltas are in the same order as in console_chess_imandyr figures, so sets of moves are built the same way.
+knight_targets = _targets([(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)])
+king_targets = _targets([(0, 1), (1, 0), (0, -1), (-1, 0), (1, -1), (-1, 1), (1, 1), (-1, -1)])
+# Straight rays: up, down, left, right. Oblique rays: left up, left down, right up, right down.
+straight_rays = [[_ray(square, *d) for d in ((-1, 0), (1, 0), (0, -1), (0, 1))] for square in range(64)]
+oblique_rays = [[_ray(square, *d) for d in ((-1, -1), (1, -1), (-1, 1), (1, 1))] for square in range(64)]
+
+
+def _reaches(piece: int, square: int) -> frozenset[int]:
+    """ Returns squares on which a change may change moves of a piece on a square, ignoring other figures. """
+    if piece == pawn:
+        row, column = positions[square]
+        return frozenset(s for s in range(64) if abs(s % 8 - column) <= 1 and 0 < abs(s // 8 - row) <= 2)
+    if piece in {knight, king}:
+        return frozenset((knight_targets if piece == knight else king_targets)[square])
+    rays = (straight_rays[square] if piece in {rook, queen} else []) + \
+           (oblique_rays[square] if piece in {bishop, queen} else [])
+    return frozenset(s for ray in rays for s in ray)
+
+
+# Squares on which a change may change moves of a piece, by piece number and square.
+reaches = [[frozenset()] * 64] + [[_reaches(piece, square) for square in range(64)] for piece in range(1, 7)]
+
+# Costs of already evaluated positions, shared by all parses.
+shared_cache = MoveCostCache(maxsize=65536)
+
+
+def _slide(squares: Sequence[int], square: int, rays: list[list[int]], color: int) -> list[list[int]]:
+    """ Cuts rays of a sliding figure at the first figure, including it if it is an enemy one. """
+    output = []
+    for c, ray in enumerate(rays[square]):
+        cut = []
+        for target in ray:
+            if squares[target]:
+                if squares[target] & black_flag != color:
+                    cut.append(target)
+                break
+            cut.append(target)
+        # Up and left rays are ordered from the farthest square in console_chess_imandyr.
+        output.append(cut[::-1] if rays is straight_rays and c in {0, 2} else cut)
+    return output
+
+
+def figure_moves(squares: Sequence[int], square: int) -> set[tuple[int, int]]:
+    """
+    Returns available moves of a figure on a compact board square, as console_chess_imandyr figure would,
+    including the iteration order of the returned set.
+    :param squares: Figure codes of a compact board.
+    :param square: Square of the figure.
+    :return: Set of positions.
+    """
+    code = squares[square]
+    piece, color = code & 7, code & black_flag
+    if piece == pawn:
+        row, column = positions[square]
+        direction = 1 if color else -1
+        straight = [(row + direction * n) * 8 + column for n in ((1, 2) if code & first_move_flag else (1,))
+                    if 0 <= row + direction * n < 8]
+        if straight and squares[straight[0]]:
+            straight = []
+        straight = [s for s in straight if not squares[s]]
+        oblique = [(row + direction) * 8 + column + c for c in (1, -1)
+                   if 0 <= row + direction < 8 and 0 <= column + c < 8]
+        oblique = [s for s in oblique if squares[s] and squares[s] & black_flag != color]
+        moves = set()
+        moves.update([positions[s] for s in straight], [positions[s] for s in oblique])
+        return moves
+    if piece in {knight, king}:
+        return {positions[s] for s in (knight_targets if piece == knight else king_targets)[square]
+                if not squares[s] or squares[s] & black_flag != color}
+    rays = []
+    if piece in {rook, queen}:
+        rays += _slide(squares, square, straight_rays, color)
+    if piece in {bishop, queen}:
+        rays += _slide(squares, square, oblique_rays, color)
+    moves = set()
+    moves.update(*([positions[s] for s in ray] for ray in rays))
+    return moves
+
+
+def attacked_cost(squares: Sequence[int], color: int) -> int:
+    """ Returns cost of the most valuable figure of the color which can be taken by an enemy figure. """
+    best = 0
+    for square, code in enumerate(squares):
+        if not code or code & black_flag == color:
+            continue
+        piece = code & 7
+        if piece == pawn:
+            row, column = positions[square]
+            direction = -1 if color else 1
+            targets = [(row + direction) * 8 + column + c for c in (1, -1)
+                       if 0 <= row + direction < 8 and 0 <= column + c < 8]
+        elif piece == knight:
+            targets = knight_targets[square]
+        elif piece == king:
+            targets = king_targets[square]
+        else:
+            targets = []
+            for rays in ((straight_rays,) if piece == rook else (oblique_rays,) if piece == bishop
+                         else (straight_rays, oblique_rays)):
+                for ray in rays[square]:
+                    for target in ray:
+                        if squares[target]:
+                            targets.append(target)
+                            break
+        for target in targets:
+            if squares[target] and squares[target] & black_flag == color and costs[squares[target] & 7] > best:
+                best = costs[squares[target] & 7]
+    return best
+
+
+def move_list(board: CompactBoard, goes_up: bool) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+    """ Returns available (from, to) moves of a player in the same order as Bot.available_moves. """
+    color = 0 if goes_up else black_flag
+    return [(positions[square], to) for square, code in enumerate(board.squares)
+            if code and code & black_flag == color for to in figure_moves(board.squares, square)]
+
+
+def move_cost(board: CompactBoard, goes_up: bool, _from: tuple[int, int], to: tuple[int, int]) -> int:
+    """
+    Returns the same cost of a move as HardBot: cost of the taken enemy figure minus cost of the most valuable
+    own figure which can be taken by the enemy after the move.
+    """
+    after = board.copy()
+    after.move(_from, to)
+    return costs[board[to] & 7] - attacked_cost(after.squares, 0 if goes_up else black_flag)
+
+
+def moves_costs(board: CompactBoard, goes_up: bool,
+                cache: Optional[MoveCostCache] = shared_cache) -> list[cost_entry]:
+    """
+    Calculates the same moves costs as HardBot, but on a compact board with precomputed attack tables
+    instead of copies of the table with figure objects.
+    :param board: Board with figures.
+    :param goes_up: Player whose moves are evaluated, True for white.
+    :param cache: Cache in which costs are looked up and stored, not used if None.
+    :return: List of (from, to, cost) tuples in the order of Bot.available_moves.
+    """
+    key = board.zobrist(goes_up)
+    entry = cache.get(key) if cache is not None else None
+    if entry is not None:
+        return entry
+    entry = [(_from, to, move_cost(board, goes_up, _from, to)) for _from, to in move_list(board, goes_up)]
+    if cache is not None:
+        cache.put(key, entry)
+    return entry
+
+
+def bot_moves_costs(bot: Bot, board: Optional[CompactBoard] = None,
+                    cache: Optional[MoveCostCache] = shared_cache) -> list[Move]:
+    """
+    Returns available moves costs of a HardBot calculated by moves_costs() and sets them as its own moves costs.
+    :param bot: Bot whose moves are evaluated.
+    :param board: Compact board of the bot table, if it is already known.
+    :param cache: Cache of costs.
+    :return: List of Move objects with their cost specified.
+    """
+    if bot._available_moves_costs is None:
+        entry = moves_costs(board or CompactBoard.from_table(bot.table), bot.goes_up, cache)
+        bot._available_moves_costs = [Move(bot.table.get_figure(_from), to, cost=cost) for _from, to, cost in entry]
+    return bot._available_moves_costs
+
+
+class TableEvaluator:
+    def __init__(self, cache: Optional[MoveCostCache] = shared_cache) -> None:
+        """
+        Evaluator for ChessParser, which calculates HardBot moves costs with attack tables in the current thread.
+        :param cache: Cache of costs shared between parses, not used if None.
+        """
+        self.cache = cache
+
+    def moves_costs(self, bots: Iterable[Bot]) -> list[list[Move]]:
+        """ Returns available moves costs of every bot. """
+        return [bot_moves_costs(bot, cache=self.cache) for bot in bots]
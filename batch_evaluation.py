@@ -0,0 +1,91 @@
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+from board import CompactBoard, piece_classes, black_flag
+
+
+def _centrality(square: int) -> float:
+    """ Returns 0 for the corner squares and 3 for the four center squares. """
+    row, column = divmod(square, 8)
+    return 3.5 - max(abs(row - 3.5), abs(column - 3.5)) - 0.5
+
+
+def _square_value(piece: int, square: int) -> float:
+    """ Positional bonus of a white piece on a square, in the units of figure costs (pawn is 1). """
+    row = square // 8
+    if piece == 1:
+        return 0.05 * (6 - row) ** 1.5 if row < 7 else 0.
+    if piece == 6:
+        return -0.1 * _centrality(square)
+    return (0.1, 0.07, 0.02, 0.03)[piece - 2] * _centrality(square)
+
+
+def _square_values() -> list[list[float]]:
+    """
+    Builds the value of every figure code on every square, positive for white figures and negative for black ones.
+    Black values are mirrored vertically. Pawns on their first move have the same value as other pawns.
+    """
+    values = [[0.] * 64 for code in range(32)]
+    for code in range(32):
+        piece = code & 7
+        if not 1 <= piece <= 6:
+            continue
+        for square in range(64):
+            if code & black_flag:
+                values[code][square] = -(piece_classes[piece].cost + _square_value(piece, square ^ 56))
+            else:
+                values[code][square] = piece_classes[piece].cost + _square_value(piece, square)
+    return values
+
+
+# Material and piece-square value of every figure code (row) on every square (column).
+square_values = _square_values()
+square_values_array = np.array(square_values, dtype=np.float64)
+
+
+def boards_array(boards: Iterable[Union[CompactBoard, bytes]]) -> np.ndarray:
+    """ Converts compact boards (or their bytes) into N×64 array of figure codes. """
+    data = b"".join(bytes(board) for board in boards)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 64)
+
+
+def evaluate(board: Union[CompactBoard, bytes], goes_up: bool = True) -> float:
+    """
+    Static evaluation of one board, without the batch: material and positions of figures from the point of view
+    of the player who goes up (white) or down.
+    """
+    score = sum(square_values[code][square] for square, code in enumerate(bytes(board)) if code)
+    return score if goes_up else -score
+
+
+def evaluate_batch(boards: Union[np.ndarray, Iterable[Union[CompactBoard, bytes]]],
+                   goes_up: Union[bool, Sequence[bool], np.ndarray] = True) -> np.ndarray:
+    """
+    Static evaluation of many boards in one vectorized pass. It gives the same scores as evaluate(),
+    but does not search any moves, so it is meant for ranking positions before their evaluation by bots.
+    :param boards: N×64 array of figure codes or compact boards.
+    :param goes_up: Side of evaluation for all boards or for every board.
+    :return: Array of N scores.
+    """
+    if not isinstance(boards, np.ndarray):
+        boards = boards_array(boards)
+    scores = square_values_array[boards, np.arange(64)].sum(axis=1)
+    return np.where(np.asarray(goes_up), scores, -scores)
+
+
+def rank(boards: Union[np.ndarray, Iterable[Union[CompactBoard, bytes]]],
+         goes_up: Union[bool, Sequence[bool], np.ndarray] = True, limit: Optional[int] = None,
+         reverse: bool = True) -> list[int]:
+    """
+    Returns indices of boards ordered by their static evaluation, best first if reverse, keeping the input order
+    of equal scores.
+    :param boards: N×64 array of figure codes or compact boards.
+    :param goes_up: Side of evaluation for all boards or for every board.
+    :param limit: Number of returned indices, all if None.
+    :param reverse: Order from the best to the worst score.
+    :return: List of indices.
+    """
+    scores = evaluate_batch(boards, goes_up)
+    order = np.argsort(-scores if reverse else scores, kind="stable")
+    return order[:limit].tolist()
@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from statistics import quantiles
+from typing import Callable, Optional
+
+from selenium.common import WebDriverException
+
+from attacks import moves_costs
+from board import CompactBoard
+from notation import fen_to_chess_set
+from parsing import truncate_moves, add_content
+from parsing_functions import ChessComTableParser, ChessSetBot, chess_com_snapshot_parse, chess_com_moves_output
+from player import chess_com_element
+
+
+corpus = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w",
+    "r1bqkbnr/pppp1ppp/2n5/4p3/3PP3/5N2/PPP2PPP/RNBQKB1R b",
+    "r1bqk2r/2ppbppp/p1n2n2/1p2p3/4P3/1B3N2/PPPP1PPP/RNBQR1K1 b",
+    "r2q1rk1/1b1nbppp/p2p1n2/1pp1p3/3PP3/2P2N1P/PPB2PP1/RNBQR1K1 w",
+    "2rq1rk1/pp1bppbp/3p1np1/4n3/3NP3/1BN1BP2/PPPQ2PP/2KR3R w",
+    "r4rk1/pp3ppp/2n1b3/q1pp4/3P4/P1PBPN2/2Q2PPP/R4RK1 b",
+    "8/5pk1/6p1/3R4/1p3P2/1P4P1/r5KP/8 w",
+    "8/8/4k3/8/2p5/8/B2K4/8 w",
+]
+
+
+class FakeElement:
+    def __init__(self, class_name: str) -> None:
+        self.class_name = class_name
+
+    def get_attribute(self, name: str) -> str:
+        return self.class_name
+
+
+class FakeDriver:
+    def __init__(self, class_names: list[str], scripts: bool = True) -> None:
+        """
+        WebDriver replacement, which returns recorded class names of figure elements and counts calls
+        which would be round trips to the browser.
+        :param class_names: Class names of page elements.
+        :param scripts: Execute scripts. If False, execute_script raises WebDriverException.
+        """
+        self.class_names, self.scripts = class_names, scripts
+        self.calls = 0
+
+    def execute_script(self, script: str, *args) -> list[str]:
+        self.calls += 1
+        if not self.scripts:
+            raise WebDriverException("Scripts are disabled.")
+        return list(self.class_names)
+
+    def find_elements(self, by: str, value: str) -> list[FakeElement]:
+        self.calls += 1
+        return [FakeElement(i) for i in self.class_names]
+
+
+def class_names(fen: str) -> list[str]:
+    """ Converts FEN into class names of figure elements from https://www.chess.com/. """
+    return [chess_com_element(f) for f in fen_to_chess_set(fen)[0].table.figures]
+
+
+def evaluated(fen: str) -> ChessSetBot:
+    """ Returns ChessSetBot of a FEN with evaluated moves of both players. """
+    chess_set = fen_to_chess_set(fen)[0]
+    chess_set.player_white.available_moves_costs
+    chess_set.player_black.available_moves_costs
+    return chess_set
+
+
+def stages() -> dict[str, tuple[Callable[[str], object], Callable[[object], object]]]:
+    """ Returns benchmarked stages as {name: (setup function of a FEN, timed function of the setup output)}. """
+    full = ChessComTableParser("//div", "", incremental=False)
+    elements = ChessComTableParser("//div", "", bulk=False, incremental=False)
+
+    def html(fen: str) -> str:
+        return "".join(f'<div class="{i}"></div>' for i in class_names(fen))
+
+    def truncated(fen: str) -> tuple[ChessSetBot, list]:
+        chess_set = evaluated(fen)
+        return chess_set, truncate_moves(chess_set.player_white.available_moves_costs)
+
+    def with_content(fen: str) -> list:
+        chess_set, moves = truncated(fen)
+        return [add_content(chess_set.table, move) for move in moves]
+
+    return {
+        "parse_bulk": (lambda fen: FakeDriver(class_names(fen)), lambda driver: full(driver).table),
+        "parse_elements": (lambda fen: FakeDriver(class_names(fen), False), lambda driver: elements(driver).table),
+        "parse_snapshot": (html, lambda page: chess_com_snapshot_parse(page).table),
+        "hardbot": (lambda fen: fen, lambda fen: fen_to_chess_set(fen)[0].player_white.available_moves_costs),
+        "attack_tables": (lambda fen: CompactBoard.from_table(fen_to_chess_set(fen)[0].table),
+                          lambda board: moves_costs(board, True, None)),
+        "truncate_moves": (lambda fen: evaluated(fen).player_white.available_moves_costs, truncate_moves),
+        "add_content": (truncated, lambda x: [add_content(x[0].table, move) for move in x[1]]),
+        "moves_output": (with_content, chess_com_moves_output),
+    }
+
+
+def measure(setup: Callable[[str], object], func: Callable[[object], object],
+            positions: list[str], repeat: int) -> dict[str, float]:
+    """
+    Times func on the setup output of every position repeat times.
+    :return: Dict with operations per second, median and 99th percentile of a call time in seconds.
+    """
+    samples = []
+    for fen in positions:
+        data = setup(fen)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(data)
+            samples.append(time.perf_counter() - start)
+    percentiles = quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {"ops_per_sec": len(samples) / sum(samples), "p50": percentiles[49], "p99": percentiles[98],
+            "samples": len(samples)}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat: int = 20, names: Optional[list[str]] = None, history: Optional[str] = "benchmarks.jsonl",
+        positions: Optional[list[str]] = None) -> dict:
+    """
+    Runs benchmarks of the selected stages over the positions corpus and prints the results together with
+    their change since the last run saved in history.
+    :param repeat: Number of timed calls per position. Slow "hardbot" stage is always called once per position.
+    :param names: Names of stages to run, all if None.
+    :param history: Path to JSON lines file to which results are appended. Results are not saved if None.
+    :param positions: FEN strings of benchmarked positions, the corpus if None.
+    :return: Results of this run.
+    """
+    previous = None
+    if history is not None and os.path.exists(history):
+        with open(history) as file:
+            for line in file:
+                if line.strip():
+                    previous = json.loads(line)
+
+    result = {"time": time.time(), "revision": git_revision(), "python": platform.python_version(), "stages": {}}
+    for name, (setup, func) in stages().items():
+        if names and name not in names:
+            continue
+        stats = measure(setup, func, positions or corpus, 1 if name == "hardbot" else repeat)
+        result["stages"][name] = stats
+        line = f"{name:<16}{stats['ops_per_sec']:>12.1f} ops/s  p50 {stats['p50'] * 1e3:9.3f} ms  " \
+               f"p99 {stats['p99'] * 1e3:9.3f} ms"
+        if previous is not None and name in previous["stages"]:
+            line += f"  {stats['ops_per_sec'] / previous['stages'][name]['ops_per_sec']:6.2f}x " \
+                    f"vs {previous['revision']}"
+        print(line)
+
+    if history is not None:
+        with open(history, "a") as file:
+            file.write(json.dumps(result) + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmarks parse, evaluation and output stages.")
+    arg_parser.add_argument("stages", nargs="*", help=f"Stages to run, all by default: {', '.join(stages())}.")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=20)
+    arg_parser.add_argument("--history", default="benchmarks.jsonl", help="File to which results are appended.")
+    args = arg_parser.parse_args()
+    run(args.repeat, args.stages, args.history)
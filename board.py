@@ -0,0 +1,118 @@
+import random
+from typing import Iterator, Optional
+
+from console_chess_imandyr.base import Table, Player, Figure
+from console_chess_imandyr.figures import Pawn, Rook, Knight, Bishop, Queen, King
+
+
+pieces = "pnbrqk"
+piece_classes = (None, Pawn, Knight, Bishop, Rook, Queen, King)
+piece_codes = {cls: code for code, cls in enumerate(piece_classes) if cls is not None}
+black_flag, first_move_flag = 8, 16
+
+# Fixed seed, so hashes stay the same between sessions and can be persisted on disk.
+_random = random.Random(0x5EED)
+zobrist_keys = [[0] * 64] + [[_random.getrandbits(64) for square in range(64)] for code in range(1, 32)]
+zobrist_goes_up = _random.getrandbits(64)
+
+
+def figure_code(piece: str, white: bool, position: tuple[int, int]) -> int:
+    """
+    Encodes a figure into one byte of a compact board.
+    :param piece: Piece letter from "pnbrqk".
+    :param white: True for white figures.
+    :param position: Position of the figure, pawns on their starting rows get the first move flag.
+    :return: Figure code.
+    """
+    code = pieces.index(piece) + 1
+    if not white:
+        code |= black_flag
+    if code & 7 == 1 and position[0] == (6 if white else 1):
+        code |= first_move_flag
+    return code
+
+
+class CompactBoard:
+    __slots__ = ("squares",)
+
+    def __init__(self, squares: bytes = bytes(64)) -> None:
+        """
+        Chess board stored as 64 bytes, one per square in the row-major order of console_chess_imandyr Table.
+        Every byte is 0 for an empty square or a figure code: piece number from 1 (pawn) to 6 (king),
+        plus 8 for black figures and 16 for pawns which have not made their first move yet.
+        :param squares: Initial content of the board.
+        """
+        self.squares = bytearray(squares)
+
+    def __getitem__(self, position: tuple[int, int]) -> int:
+        return self.squares[position[0] * 8 + position[1]]
+
+    def __setitem__(self, position: tuple[int, int], code: int) -> None:
+        self.squares[position[0] * 8 + position[1]] = code
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.squares)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CompactBoard) and self.squares == other.squares
+
+    def __hash__(self) -> int:
+        return hash(bytes(self.squares))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({bytes(self.squares)!r})"
+
+    def copy(self) -> "CompactBoard":
+        return CompactBoard(self.squares)
+
+    @classmethod
+    def from_table(cls, table: Table) -> "CompactBoard":
+        """ Creates a compact board with the figures of a table. """
+        board = cls()
+        for f in table.figures:
+            code = piece_codes[type(f)]
+            if not f.player.goes_up:
+                code |= black_flag
+            if isinstance(f, Pawn) and f.first_move:
+                code |= first_move_flag
+            board[f.position] = code
+        return board
+
+    def move(self, _from: tuple[int, int], to: tuple[int, int]) -> None:
+        """ Moves a figure to another square, replacing its content. Moved pawns lose the first move flag. """
+        self[to] = self[_from] & ~first_move_flag
+        self[_from] = 0
+
+    def figures(self) -> Iterator[tuple[tuple[int, int], int]]:
+        """ Yields (position, code) tuples of all figures in the row-major order. """
+        for square, code in enumerate(self.squares):
+            if code:
+                yield divmod(square, 8), code
+
+    def changed(self, other: "CompactBoard") -> list[tuple[int, int]]:
+        """ Returns positions of all squares whose content differs between this and another board. """
+        return [divmod(square, 8) for square, (a, b) in enumerate(zip(self.squares, other.squares)) if a != b]
+
+    def create_figure(self, position: tuple[int, int], table: Table,
+                      white: Player, black: Player) -> Optional[Figure]:
+        """ Creates a figure for a table from the code on the given position or returns None if it is empty. """
+        code = self[position]
+        if not code:
+            return None
+        figure = piece_classes[code & 7](table, black if code & black_flag else white)
+        if isinstance(figure, Pawn):
+            figure.first_move = bool(code & first_move_flag)
+        return figure
+
+    def fill(self, table: Table, white: Player, black: Player) -> None:
+        """ Places figures from this board on a table, white and black figures are owned by given players. """
+        for position, code in self.figures():
+            table.set_figure(self.create_figure(position, table, white, black), position)
+
+    def zobrist(self, goes_up: bool) -> int:
+        """ Calculates Zobrist hash of the board with given side to move (True for white). """
+        h = zobrist_goes_up if goes_up else 0
+        for square, code in enumerate(self.squares):
+            if code:
+                h ^= zobrist_keys[code][square]
+        return h
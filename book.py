@@ -0,0 +1,142 @@
+import mmap
+import struct
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional, TYPE_CHECKING
+
+from console_chess_imandyr.bot import Bot, Move
+from console_chess_imandyr.figures import Rook, King
+
+from notation import chess_set_to_fen
+from parsing_functions import ChessSetBot
+
+if TYPE_CHECKING:
+    from session import GameSession
+
+
+class MappedTable(ABC):
+    record = struct.Struct(">Q8x")
+    # True if costs of moves are not HardBot costs, so they are shown as book moves and not as the best and worst.
+    book = False
+
+    def __init__(self, path: str) -> None:
+        """
+        Read-only table of fixed-size records sorted by the 64-bit big-endian key in their first 8 bytes.
+        The file is memory-mapped, so opening it is instant and only the pages touched by lookups are read.
+        :param path: Path to the file.
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._map: Optional[mmap.mmap] = None
+        self.size = 0
+        if self._file.seek(0, 2) >= self.record.size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = len(self._map) // self.record.size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _key(self, index: int) -> int:
+        return struct.unpack_from(">Q", self._map, index * self.record.size)[0]
+
+    def records(self, key: int) -> Iterator[tuple]:
+        """ Yields all unpacked records with the given key. """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        while low < self.size and self._key(low) == key:
+            yield self.record.unpack_from(self._map, low * self.record.size)
+            low += 1
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def lookup(self, bot: Bot, session: Optional["GameSession"] = None) -> Optional[list[Move]]:
+        """
+        Returns moves with costs for the bot's position or None if the position is not in the table.
+        On a hit, moves are also set as the bot's own moves costs.
+        :param bot: Bot whose moves are looked up.
+        :param session: Game session of the position, whose tracked rights are used instead of guessed ones.
+        """
+        moves = self._moves(bot, session)
+        if moves:
+            bot._available_moves_costs = moves
+            return moves
+        return None
+
+    @abstractmethod
+    def _moves(self, bot: Bot, session: Optional["GameSession"]) -> list[Move]:
+        """ Implementation-specific lookup of moves of the bot's position. Must return an empty list on a miss. """
+
+
+def castling_rights(chess_set: ChessSetBot) -> str:
+    """ Returns FEN castling field, assuming kings and rooks on their initial squares have not moved. """
+    rights = ""
+    for row, (king, queen) in ((7, "KQ"), (0, "kq")):
+        if isinstance(chess_set.table.get_figure((row, 4)), King):
+            for column, char in ((7, king), (0, queen)):
+                if isinstance(figure := chess_set.table.get_figure((row, column)), Rook) \
+                        and figure.player.goes_up == (row == 7):
+                    rights += char
+    return rights or "-"
+
+
+def polyglot_key(chess_set: ChessSetBot, goes_up: bool, castling: Optional[str] = None,
+                 en_passant: str = "-") -> int:
+    """
+    Calculates the Polyglot key of a position. Requires python-chess package.
+    :param chess_set: Position.
+    :param goes_up: Side to move, True for white.
+    :param castling: FEN castling field, guessed by castling_rights() if None.
+    :param en_passant: FEN en passant field.
+    :return: 64-bit key.
+    """
+    import chess.polyglot
+    fen = f"{chess_set_to_fen(chess_set, goes_up)} {castling or castling_rights(chess_set)} {en_passant} 0 1"
+    return chess.polyglot.zobrist_hash(chess.Board(fen))
+
+
+class PolyglotBook(MappedTable):
+    record = struct.Struct(">QHHI")
+    book = True
+
+    def __init__(self, path: str, cost: int = 0) -> None:
+        """
+        Opening book in the Polyglot format. Requires python-chess package, which is checked on opening.
+        :param path: Path to the book file.
+        :param cost: Cost of every book move. Book weights are not costs in HardBot units (figure costs),
+         so book moves get the same cost, 0 by default, as moves which neither win nor lose material,
+         and are ordered by weight from the most played one. Moves with zero weight are skipped.
+        """
+        try:
+            import chess.polyglot
+        except ImportError as err:
+            raise ImportError("PolyglotBook requires python-chess package.") from err
+        super().__init__(path)
+        self.cost = cost
+
+    def _moves(self, bot: Bot, session: Optional["GameSession"]) -> list[Move]:
+        """
+        Book moves of the bot ordered by weight, with self.cost as their cost. Castling and en passant rights
+        are taken from the session if it is at this position, and guessed from figures otherwise.
+        """
+        chess_set = ChessSetBot(bot.table)
+        rights = session.rights(chess_set, bot.goes_up) if session is not None else None
+        weighted = []
+        for key, move, weight, learn in self.records(polyglot_key(chess_set, bot.goes_up, *(rights or ()))):
+            _from = (7 - (move >> 9 & 7), move >> 6 & 7)
+            to = (7 - (move >> 3 & 7), move & 7)
+            figure = bot.table.get_figure(_from)
+            if isinstance(figure, King) and abs(to[1] - _from[1]) > 1:
+                to = (to[0], 6 if to[1] > _from[1] else 2)
+            if figure is None or figure.player.goes_up != bot.goes_up:
+                return []
+            if weight:
+                weighted.append((weight, Move(figure, to, cost=self.cost)))
+        weighted.sort(key=lambda x: x[0], reverse=True)
+        return [move for weight, move in weighted]
@@ -0,0 +1,192 @@
+import argparse
+import io
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import median
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from console_chess_imandyr.bot import Move
+
+from attacks import TableEvaluator
+from benchmark import FakeDriver, class_names, corpus as benchmark_corpus
+from evaluation import MoveEvaluator
+from notation import fen_to_chess_set, chess_set_to_fen, read_pgn, replay
+from parsing import truncate_moves
+from parsing_functions import ChessComTableParser, ChessSetBot, chess_com_snapshot_parse
+from search import TimedSearch
+
+
+games = """
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 6. Re1 b5 7. Bb3 d6 8. c3 O-O 9. h3 Nb8 10. d4 Nbd7
+11. Nbd2 Bb7 12. Bc2 Re8 13. Nf1 Bf8 14. Ng3 g6 15. a4 c5 16. d5 c4 17. Bg5 h6 18. Bxf6 Nxf6 19. axb5 axb5
+20. Rxa8 Qxa8 1/2-1/2
+
+1. d4 d5 2. c4 e6 3. Nc3 Nf6 4. Bg5 Be7 5. e3 O-O 6. Nf3 Nbd7 7. Rc1 c6 8. Bd3 dxc4 9. Bxc4 Nd5 10. Bxe7 Qxe7
+11. O-O Nxc3 12. Rxc3 e5 13. Qc2 exd4 14. exd4 Nf6 15. Re1 Qd6 16. Ne5 Be6 17. Bxe6 fxe6 18. Rf3 Nd5 1-0
+
+1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6 6. Be3 e5 7. Nb3 Be6 8. f3 Be7 9. Qd2 O-O 10. O-O-O Nbd7
+11. g4 b5 12. g5 b4 13. Ne2 Ne8 14. f4 a5 15. f5 a4 16. Nbd4 exd4 17. Nxd4 b3 18. Kb1 bxc2+ 19. Nxc2 Bb3 0-1
+"""
+
+moves_output = tuple[tuple[tuple, ...], tuple[tuple, ...]]
+# Modes compared with the reference one by default, all of them give the same moves as HardBot.
+default_modes = ("tables", "bulk:tables", "elements:tables", "incremental:tables", "snapshot:tables", "search")
+
+
+def default_corpus() -> list[str]:
+    """ Returns FEN strings of the benchmark positions and of every position of the built-in games. """
+    positions = list(benchmark_corpus)
+    for tags, moves in read_pgn(io.StringIO(games)):
+        positions += [chess_set_to_fen(chess_set, goes_up) for ply, san, chess_set, goes_up in replay(tags, moves)]
+    return positions
+
+
+class Mode(NamedTuple):
+    """ Way of getting moves costs of a position: parser of a FEN and evaluator of the parsed position. """
+    setup: Callable[[str], object]
+    parse: Callable[[object], ChessSetBot]
+    evaluate: Callable[[ChessSetBot], tuple[list[Move], list[Move]]]
+
+
+def parsers() -> dict[str, tuple[Callable[[str], object], Callable[[object], ChessSetBot]]]:
+    """ Returns parsers as {name: (setup function of a FEN, timed parse function of the setup output)}. """
+    page = FakeDriver([])
+
+    def next_page(fen: str) -> FakeDriver:
+        page.class_names = class_names(fen)
+        return page
+
+    def html(fen: str) -> str:
+        return "".join(f'<div class="{i}"></div>' for i in class_names(fen))
+
+    return {
+        "fen": (lambda fen: fen, lambda fen: fen_to_chess_set(fen)[0]),
+        "bulk": (lambda fen: FakeDriver(class_names(fen)), ChessComTableParser("//div", "", incremental=False)),
+        "elements": (lambda fen: FakeDriver(class_names(fen), False),
+                     ChessComTableParser("//div", "", bulk=False, incremental=False)),
+        "incremental": (next_page, ChessComTableParser("//div", "")),
+        "snapshot": (html, chess_com_snapshot_parse),
+    }
+
+
+def evaluators(executor: Optional[ProcessPoolExecutor] = None) -> dict[str, Callable[[ChessSetBot], tuple]]:
+    """ Returns evaluators of both players moves by name. Process pool evaluator is included if executor is set. """
+    tables = TableEvaluator(None)
+    output = {
+        "hardbot": lambda chess_set: (chess_set.player_white.available_moves_costs,
+                                      chess_set.player_black.available_moves_costs),
+        "tables": lambda chess_set: tuple(tables.moves_costs([chess_set.player_white, chess_set.player_black])),
+        "search": lambda chess_set: tuple(TimedSearch(3600, max_depth=1)(bot).moves
+                                          for bot in (chess_set.player_white, chess_set.player_black)),
+    }
+    if executor is not None:
+        pool = MoveEvaluator(executor)
+        output["process_pool"] = lambda chess_set: tuple(pool.moves_costs([chess_set.player_white,
+                                                                           chess_set.player_black]))
+    return output
+
+
+def create_mode(name: str, executor: Optional[ProcessPoolExecutor] = None) -> Mode:
+    """
+    Creates a mode from a name like "bulk:tables". Omitted parser is "fen" and omitted evaluator is "hardbot",
+    so "bulk" and "tables" are also valid names.
+    """
+    all_parsers, all_evaluators = parsers(), evaluators(executor)
+    parser, colon, evaluator = name.partition(":")
+    if not colon and parser in all_evaluators:
+        parser, evaluator = "", parser
+    if (parser or "fen") not in all_parsers or (evaluator or "hardbot") not in all_evaluators:
+        raise ValueError(f"Unknown mode {name!r}, parsers: {list(all_parsers)}, evaluators: {list(all_evaluators)}.")
+    return Mode(*all_parsers[parser or "fen"], all_evaluators[evaluator or "hardbot"])
+
+
+def truncated(moves: tuple[list[Move], list[Move]], n_best: int, n_worst: int) -> moves_output:
+    """ Converts truncate_moves output of both players into comparable tuples. """
+    return tuple(tuple((type(m.figure).__name__, m.figure.position, m.to, m.cost)
+                       for m in truncate_moves(player_moves, n_best, n_worst)) for player_moves in moves)
+
+
+def measure(mode: Mode, positions: Iterable[str], n_best: int, n_worst: int) -> list[tuple[moves_output, float]]:
+    """ Returns truncated moves of every position in a mode with the time in seconds of its parse and evaluation. """
+    results = []
+    for fen in positions:
+        data = mode.setup(fen)
+        start = time.perf_counter()
+        moves = mode.evaluate(mode.parse(data))
+        elapsed = time.perf_counter() - start
+        results.append((truncated(moves, n_best, n_worst), elapsed))
+    return results
+
+
+def run(positions: Optional[list[str]] = None, modes: Iterable[str] = default_modes,
+        reference: str = "fen:hardbot", n_best: int = 3, n_worst: int = 3, workers: int = 0,
+        verbose: bool = True, strict: bool = True) -> dict:
+    """
+    Runs positions through the reference mode and every other mode, compares their truncate_moves output
+    and reports speedup of every mode against the reference on every position.
+    :param positions: FEN strings of positions, default_corpus() if None. In the "incremental" parser mode,
+     positions are parsed one after another as consecutive states of one page.
+    :param modes: Names of compared modes as "parser:evaluator". Parsers: fen, bulk, elements, incremental,
+     snapshot. Evaluators: hardbot, tables, search and process_pool (only if workers are set).
+    :param reference: Name of the reference mode.
+    :param n_best: Number of the best moves passed to truncate_moves.
+    :param n_worst: Number of the worst moves passed to truncate_moves.
+    :param workers: Number of processes of the process_pool evaluator.
+    :param verbose: Print speedup of every mode on every position, and not only the summary.
+    :param strict: Raise AssertionError if any mode output differs from the reference.
+    :return: Dict with "positions" and {mode: {"speedup": per position list, "mismatches": position indices,
+     "total_speedup": ratio of total times}} under "modes".
+    """
+    positions = positions if positions is not None else default_corpus()
+    executor = ProcessPoolExecutor(workers) if workers else None
+    try:
+        expected = measure(create_mode(reference, executor), positions, n_best, n_worst)
+        results = {"positions": positions, "modes": {}}
+        for name in modes:
+            measured = measure(create_mode(name, executor), positions, n_best, n_worst)
+            results["modes"][name] = {
+                "speedup": [reference_time / (elapsed or 1e-9) for (_, reference_time), (_, elapsed)
+                            in zip(expected, measured)],
+                "mismatches": [i for i, ((a, _), (b, _)) in enumerate(zip(expected, measured)) if a != b],
+                "total_speedup": sum(t for _, t in expected) / (sum(t for _, t in measured) or 1e-9),
+            }
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if verbose:
+        print(f"{'#':>4}  " + "".join(f"{name:>20}" for name in results["modes"]))
+        for i in range(len(positions)):
+            print(f"{i:>4}  " + "".join(f"{result['speedup'][i]:>19.2f}{'!' if i in result['mismatches'] else 'x'}"
+                                        for result in results["modes"].values()))
+    for name, result in results["modes"].items():
+        print(f"{name:<24} total {result['total_speedup']:8.2f}x  median {median(result['speedup']):8.2f}x  "
+              f"mismatches {len(result['mismatches'])}/{len(positions)}")
+
+    if strict:
+        failed = {name: result["mismatches"] for name, result in results["modes"].items() if result["mismatches"]}
+        if failed:
+            raise AssertionError(f"Output differs from {reference} in modes and positions: {failed}.")
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compares moves of alternate parser and evaluator modes "
+                                                     "with the reference mode and reports their speedup.")
+    arg_parser.add_argument("modes", nargs="*", help="Modes as parser:evaluator, default ones if omitted.")
+    arg_parser.add_argument("-r", "--reference", default="fen:hardbot")
+    arg_parser.add_argument("-i", "--input", default=None, help="File with FEN lines instead of the default corpus.")
+    arg_parser.add_argument("-w", "--workers", type=int, default=0, help="Processes of the process_pool evaluator.")
+    arg_parser.add_argument("-q", "--quiet", action="store_true", help="Print only the summary.")
+    args = arg_parser.parse_args()
+
+    fens = None
+    if args.input is not None:
+        with open(args.input) as file:
+            fens = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+    try:
+        run(fens, args.modes or default_modes, args.reference, workers=args.workers, verbose=not args.quiet)
+    except AssertionError as err:
+        print(err, file=sys.stderr)
+        sys.exit(1)
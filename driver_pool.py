@@ -0,0 +1,146 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TYPE_CHECKING
+
+from selenium.common import WebDriverException
+
+from parsing_functions import authorization_function, AuthorizationError
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+
+def start_chrome() -> "WebDriver":
+    """ Starts a new Chrome WebDriver session. Selenium WebDriver is imported only on the first call. """
+    from selenium import webdriver
+    return webdriver.Chrome()
+
+
+class DriverPool:
+    def __init__(self, size: int = 1, factory: Callable[[], "WebDriver"] = start_chrome,
+                 cookies_url: str = "https://www.chess.com/") -> None:
+        """
+        Pool of WebDriver sessions, which are started only when borrowed for the first time
+        and reused after they are returned.
+
+        Cookies of the first successful authorization are kept and added to every other session,
+        so authorization function runs only once per pool.
+
+        :param size: Maximal number of sessions. Borrowers wait for a returned session when all are in use.
+        :param factory: Function which starts a new WebDriver session.
+        :param cookies_url: URL of the website, which must be opened to add the kept cookies to a session.
+        """
+        self.size, self.factory, self.cookies_url = size, factory, cookies_url
+        self.cookies: Optional[list[dict]] = None
+        self._idle: list["WebDriver"] = []
+        self._authorized: set[int] = set()
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        """ Number of started sessions. """
+        return self._count
+
+    @staticmethod
+    def healthy(driver: "WebDriver") -> bool:
+        """ Checks if a session still responds. """
+        try:
+            driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _quit(self, driver: "WebDriver") -> None:
+        self._authorized.discard(id(driver))
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def _authorize(self, driver: "WebDriver", authorization: authorization_function) -> None:
+        """ Authorizes a session with the kept cookies or with authorization function, keeping its cookies. """
+        if id(driver) in self._authorized:
+            return
+        if self.cookies is not None:
+            driver.get(self.cookies_url)
+            for cookie in self.cookies:
+                driver.add_cookie(cookie)
+        else:
+            authorization(driver)
+            self.cookies = driver.get_cookies()
+            print("Authorization to www.chess.com was successful.")
+        self._authorized.add(id(driver))
+
+    def acquire(self, url: Optional[str] = None, authorization: Optional[authorization_function] = None) -> "WebDriver":
+        """
+        Borrows a healthy session from the pool, starting a new one if there are no idle sessions
+        and the pool is not full, or waiting for a returned session otherwise. Dead sessions are replaced.
+        If the session can't be set up, it is released as broken and the exception is raised.
+        :param url: URL which will be opened in the session.
+        :param authorization: Function for authorization on the website, used if the session is not authorized yet.
+        :return: WebDriver session, which must be returned with .release().
+        """
+        while True:
+            with self._condition:
+                while not self._idle and self._count >= self.size:
+                    self._condition.wait()
+                driver = self._idle.pop() if self._idle else None
+                if driver is None:
+                    self._count += 1
+            # Health of an idle session is checked outside of the lock, so a slow session does not block others.
+            if driver is None or self.healthy(driver):
+                break
+            self.release(driver, broken=True)
+
+        if driver is None:
+            try:
+                driver = self.factory()
+            except Exception:
+                with self._condition:
+                    self._count -= 1
+                    self._condition.notify()
+                raise
+        try:
+            if authorization is not None:
+                try:
+                    self._authorize(driver, authorization)
+                except AuthorizationError as err:
+                    print(err)
+            if url is not None:
+                driver.get(url)
+        except Exception:
+            self.release(driver, broken=True)
+            raise
+        return driver
+
+    def release(self, driver: "WebDriver", broken: bool = False) -> None:
+        """ Returns a session to the pool. Broken sessions are quit and replaced on the next borrow. """
+        with self._condition:
+            if broken:
+                self._quit(driver)
+                self._count -= 1
+            else:
+                self._idle.append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def borrow(self, url: Optional[str] = None,
+               authorization: Optional[authorization_function] = None) -> Iterator["WebDriver"]:
+        """ Context manager which borrows a session and returns it on exit. """
+        driver = self.acquire(url, authorization)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = not self.healthy(driver)
+            raise
+        finally:
+            self.release(driver, broken)
+
+    def close(self) -> None:
+        """ Quits all idle sessions. """
+        with self._condition:
+            for driver in self._idle:
+                self._quit(driver)
+                self._count -= 1
+            self._idle.clear()
@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import Executor
+from typing import Optional, Sequence, cast
+
+from console_chess_imandyr.bot import Bot, HardBot, Move
+
+from board import CompactBoard
+from parsing_functions import ChessSetBot
+
+
+def restore(table_snapshot: bytes) -> ChessSetBot:
+    """ Creates ChessSetBot with figures placed as in a given snapshot of a CompactBoard. """
+    chess_set = ChessSetBot()
+    CompactBoard(table_snapshot).fill(chess_set.table, chess_set.player_white, chess_set.player_black)
+    return chess_set
+
+
+def score_moves(table_snapshot: bytes, goes_up: bool,
+                moves: list[tuple[tuple[int, int], tuple[int, int]]]) -> list[int]:
+    """
+    Calculates HardBot costs of given moves in a position restored from a snapshot.
+    :param table_snapshot: Bytes of a CompactBoard with figures of the table.
+    :param goes_up: Which player makes the moves.
+    :param moves: List of moves in form of (from, to) positions.
+    :return: List of moves costs in the same order as moves.
+    """
+    chess_set = restore(table_snapshot)
+    bot = cast(HardBot, chess_set.player_white if goes_up else chess_set.player_black)
+    return [sum(bot.value_of_move(_from, to)) for _from, to in moves]
+
+
+class MoveEvaluator:
+    def __init__(self, executor: Executor, chunks: Optional[int] = None) -> None:
+        """
+        Evaluates moves costs of HardBots in a given executor, instead of the current thread.
+        Both thread and process pools can be used, but only process pools run evaluation in parallel.
+        :param executor: Executor in which the evaluation will run.
+        :param chunks: Number of parts into which the moves of every bot are split,
+         so they can be evaluated by different workers. Equals to the number of CPUs if None.
+        """
+        self.executor = executor
+        self.chunks = chunks or os.cpu_count() or 1
+
+    def moves_costs(self, bots: Sequence[Bot]) -> list[list[Move]]:
+        """
+        Evaluates available moves costs of all given bots at once. Results are the same as in
+        .available_moves_costs of each bot and also set as them.
+        :param bots: Bots which moves will be evaluated. Must be HardBots or have already evaluated moves.
+        :return: List with lists of Move objects with their cost specified for each bot.
+        """
+        tasks = []
+        for bot in bots:
+            if bot._available_moves_costs is not None:
+                tasks.append(None)
+                continue
+            table_snapshot = bytes(CompactBoard.from_table(bot.table))
+            moves = bot.available_moves
+            size = -(-len(moves) // self.chunks)
+            parts = [moves[i:i + size] for i in range(0, len(moves), size or 1)]
+            tasks.append([(part, self.executor.submit(score_moves, table_snapshot, bot.goes_up,
+                                                      [(move.figure.position, move.to) for move in part]))
+                          for part in parts])
+
+        for bot, parts in zip(bots, tasks):
+            if parts is not None:
+                bot._available_moves_costs = [Move(move.figure, move.to, cost=cost)
+                                              for part, future in parts
+                                              for move, cost in zip(part, future.result())]
+        return [bot.available_moves_costs for bot in bots]
@@ -0,0 +1,76 @@
+import cProfile
+import pstats
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+from move_cache import MoveCostCache
+
+
+metrics_callback = Callable[[dict], None]
+
+
+class StageTimer:
+    def __init__(self, enabled: bool = True) -> None:
+        """
+        Collects durations of named stages of some work.
+        :param enabled: If False, stages are not timed at all.
+        """
+        self.enabled = enabled
+        self.stages: dict[str, float] = {}
+        self._start = perf_counter()
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.) + perf_counter() - start
+
+    def stage(self, name: str) -> ContextManager[None]:
+        """ Context manager which adds the time spent inside of it to the stage with given name. """
+        return self._timed(name) if self.enabled else nullcontext()
+
+    def add(self, stages: dict[str, float]) -> None:
+        """ Adds durations of already timed stages. """
+        if self.enabled:
+            for name, duration in stages.items():
+                self.stages[name] = self.stages.get(name, 0.) + duration
+
+    def metrics(self, nodes: int = 0, cache: Optional[MoveCostCache] = None,
+                cache_before: tuple[int, int] = (0, 0), **extra: Any) -> dict:
+        """
+        Returns collected metrics as a dict.
+        :param nodes: Number of positions evaluated by bots.
+        :param cache: Cache of moves costs, whose hits and misses will be reported.
+        :param cache_before: Hits and misses of the cache before the timed work, to report only the new ones.
+        :param extra: Any other metrics to add.
+        :return: Dict with "stages" durations in seconds (including "total"), "nodes", "cache" and extra metrics.
+        """
+        output = {"stages": {**self.stages, "total": perf_counter() - self._start}, "nodes": nodes, **extra}
+        if cache is not None:
+            hits, misses = cache.hits - cache_before[0], cache.misses - cache_before[1]
+            output["cache"] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses or 1),
+                               "total_hit_rate": cache.hits / (cache.hits + cache.misses or 1), "size": len(cache)}
+        return output
+
+
+def profile(func: Callable[[], Any], path: Optional[str] = None, sort: str = "cumulative",
+            limit: int = 30) -> pstats.Stats:
+    """
+    Calls func under cProfile.
+    :param func: Profiled function.
+    :param path: Path to which the profile will be dumped, for external viewers. Top functions are printed if None.
+    :param sort: Sort key of the printed functions.
+    :param limit: Number of printed functions.
+    :return: Collected statistics.
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(func)
+    stats = pstats.Stats(profiler)
+    if path is None:
+        stats.sort_stats(sort).print_stats(limit)
+    else:
+        stats.dump_stats(path)
+    return stats
@@ -0,0 +1,39 @@
+import argparse
+import sys
+from typing import Iterable, Optional
+
+from notation import fen_to_chess_set, NotationError
+from parsing import ChessParser
+from position_store import PositionStore
+
+
+def run(fens: Iterable[str], n_best: int = 3, n_worst: int = 3, store: Optional[PositionStore] = None) -> int:
+    """
+    Prints analysis of positions without a browser, in the same form as ChessParser.parse() does.
+    :param fens: FEN strings of positions.
+    :param n_best: Number of the best moves of every player.
+    :param n_worst: Number of the worst moves of every player.
+    :param store: Store of analysed positions, which is read and appended.
+    :return: Number of invalid positions.
+    """
+    chess_parser, errors = ChessParser(n_best=n_best, n_worst=n_worst, store=store), 0
+    for fen in fens:
+        try:
+            chess_parser.print_analysis(fen_to_chess_set(fen)[0])
+        except NotationError as err:
+            print(err, file=sys.stderr)
+            errors += 1
+    return errors
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Prints analysis of FEN positions without a browser.")
+    arg_parser.add_argument("fen", nargs="*", help="FEN of one position, FEN lines are read from stdin if omitted.")
+    arg_parser.add_argument("--n-best", type=int, default=3)
+    arg_parser.add_argument("--n-worst", type=int, default=3)
+    arg_parser.add_argument("--store", default=None, help="Position store file, which is read and appended.")
+    args = arg_parser.parse_args()
+
+    lines = [" ".join(args.fen)] if args.fen else (line.strip() for line in sys.stdin if line.strip())
+    position_store = PositionStore(args.store) if args.store is not None else None
+    sys.exit(1 if run(lines, args.n_best, args.n_worst, position_store) else 0)
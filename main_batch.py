@@ -0,0 +1,154 @@
+import argparse
+import itertools
+import json
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Iterable, Iterator, Optional, TextIO, Union
+
+from board import CompactBoard
+from move_cache import cost_entry
+from notation import read_pgn, replay, fen_to_chess_set, chess_set_to_fen, NotationError
+from parsing import analyse
+from parsing_functions import ChessSetBot
+from position_store import PositionStore
+
+
+batch_task = tuple[str, Union[list[str], tuple[int, dict[str, str], list[str]]]]
+new_position = tuple[bytes, bool, list[cost_entry]]
+
+# Stores opened for reading by worker processes, by path.
+_stores: dict[str, PositionStore] = {}
+
+
+def read_tasks(file: TextIO, input_format: str = "auto", chunk_size: int = 64) -> Iterator[batch_task]:
+    """
+    Lazily reads positions from a file and groups them into tasks for analysis.
+    :param file: Text file or stream with FEN lines or PGN games.
+    :param input_format: "fen", "pgn" or "auto" to detect it by the first non-empty line.
+    :param chunk_size: Number of FEN lines in one task. Every PGN game is a separate task.
+    :return: Iterator of ("fen", lines) or ("pgn", (game number, tags, moves)) tuples.
+    """
+    lines: Iterable[str] = file
+    if input_format == "auto":
+        first = next((line for line in file if line.strip()), "")
+        input_format = "pgn" if first.lstrip().startswith(("[", "1.")) else "fen"
+        lines = itertools.chain([first], file)
+
+    if input_format == "pgn":
+        for game in enumerate(read_pgn(lines), 1):
+            yield "pgn", (game[0], *game[1])
+    else:
+        lines = (line.strip() for line in lines)
+        lines = (line for line in lines if line and not line.startswith("#"))
+        while chunk := list(itertools.islice(lines, chunk_size)):
+            yield "fen", chunk
+
+
+def analyse_task(task: batch_task, n_best: int = 3, n_worst: int = 3) -> list[dict]:
+    """ Analyses all positions of a task and returns them as a list of JSON-serializable dicts. """
+    return analyse_stored_task(task, n_best, n_worst)[0]
+
+
+def analyse_stored_task(task: batch_task, n_best: int = 3, n_worst: int = 3,
+                        store: Union[str, PositionStore, None] = None) -> tuple[list[dict], list[new_position]]:
+    """
+    Analyses all positions of a task, taking moves costs of already analysed positions from a store.
+    :param task: Task from read_tasks().
+    :param n_best: Number of the best moves of every player in results.
+    :param n_worst: Number of the worst moves of every player in results.
+    :param store: PositionStore or path of a store, which is opened once per process and only read.
+    :return: List of JSON-serializable dicts and list of (board bytes, goes_up, moves costs) of positions
+     which were not found in the store, to be appended to it by the caller.
+    """
+    if isinstance(store, str):
+        if store not in _stores:
+            _stores[store] = PositionStore(store, read_only=True)
+        store = _stores[store]
+    new: list[new_position] = []
+
+    def analysed(chess_set: ChessSetBot) -> dict[str, str]:
+        if store is not None:
+            for bot in (chess_set.player_white, chess_set.player_black):
+                if store.lookup(bot) is None:
+                    new.append((bytes(CompactBoard.from_table(bot.table)), bot.goes_up,
+                                [(move.figure.position, move.to, move.cost) for move in bot.available_moves_costs]))
+        return analyse(chess_set, n_best, n_worst)
+
+    kind, payload = task
+    records = []
+    if kind == "fen":
+        for fen in payload:
+            try:
+                chess_set, goes_up = fen_to_chess_set(fen)
+                records.append({"fen": fen, **analysed(chess_set)})
+            except NotationError as err:
+                records.append({"fen": fen, "error": str(err)})
+    else:
+        game, tags, moves = payload
+        try:
+            for ply, san, chess_set, goes_up in replay(tags, moves):
+                records.append({"game": game, "ply": ply, "move": san, "fen": chess_set_to_fen(chess_set, goes_up),
+                                **analysed(chess_set)})
+        except NotationError as err:
+            records.append({"game": game, "error": str(err)})
+    return records, new
+
+
+def run(file: TextIO, output: TextIO, input_format: str = "auto", workers: int = 1,
+        n_best: int = 3, n_worst: int = 3, store: Optional[PositionStore] = None) -> None:
+    """
+    Analyses all positions from a file and writes results to output as JSON lines in the input order.
+    Only a few tasks per worker are read ahead, so memory use does not depend on the input size.
+    :param file: Text file or stream with FEN lines or PGN games.
+    :param output: Text file or stream to which results will be written.
+    :param input_format: "fen", "pgn" or "auto".
+    :param workers: Number of worker processes. Analysis is made in the current process if 1 or less.
+    :param n_best: Number of the best moves of every player in results.
+    :param n_worst: Number of the worst moves of every player in results.
+    :param store: Store of analysed positions. Positions found in it are not evaluated again, and all other
+     positions are appended to it. Workers only read the store, while new positions are written by this process.
+    :return: None
+    """
+    def write(result: tuple[list[dict], list[new_position]]) -> None:
+        records, new = result
+        for record in records:
+            output.write(json.dumps(record) + "\n")
+        for board, goes_up, costs in new:
+            store.put(CompactBoard(board), goes_up, costs)
+
+    tasks = read_tasks(file, input_format)
+    if workers <= 1:
+        for task in tasks:
+            write(analyse_stored_task(task, n_best, n_worst, store))
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending: deque[Future] = deque()
+        for task in tasks:
+            pending.append(executor.submit(analyse_stored_task, task, n_best, n_worst,
+                                           store.path if store is not None else None))
+            if len(pending) >= workers * 2:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Analyses positions from FEN lines or PGN games.")
+    arg_parser.add_argument("input", nargs="?", default="-", help="Input file, or - for stdin.")
+    arg_parser.add_argument("-o", "--output", default="-", help="Output file for JSON lines, or - for stdout.")
+    arg_parser.add_argument("-f", "--format", default="auto", choices=("auto", "fen", "pgn"))
+    arg_parser.add_argument("-w", "--workers", type=int, default=1)
+    arg_parser.add_argument("--n-best", type=int, default=3)
+    arg_parser.add_argument("--n-worst", type=int, default=3)
+    arg_parser.add_argument("--store", default=None, help="Position store file, which is read and appended.")
+    args = arg_parser.parse_args()
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    position_store = PositionStore(args.store) if args.store is not None else None
+    with input_file, output_file:
+        run(input_file, output_file, args.format, args.workers, args.n_best, args.n_worst, position_store)
+    if position_store is not None:
+        position_store.close()
@@ -1,21 +1,32 @@
-from pynput.keyboard import HotKey, Listener
-from selenium.webdriver.remote.webdriver import WebDriver
+import threading
+from typing import Optional, TYPE_CHECKING
 
 from parsing import ChessParser
-from parsing_functions import chess_com_authorization, chess_com_pvp_parse, chess_com_bot_parse, chess_com_universal_parser
+from parsing_functions import (chess_com_authorization, chess_com_pvp_parse, chess_com_bot_parse,
+                               chess_com_universal_parser, BoardWatcher)
 
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
 
-def run(url: str, parse_hotkey: str, username: str, password: str, parse_func=chess_com_universal_parser) -> None:
 
-    def auth(driver: WebDriver) -> None:
+def run(url: str, parse_hotkey: str, username: str, password: str, parse_func=chess_com_universal_parser,
+        watcher: Optional[BoardWatcher] = None) -> None:
+    from pynput.keyboard import HotKey, Listener
+
+    def auth(driver: "WebDriver") -> None:
         chess_com_authorization(driver, username, password)
 
     chess_parser = ChessParser(url, parse_func=parse_func, authorization=auth)
+    chess_parser.open()
 
     hotkey = HotKey(HotKey.parse(parse_hotkey), chess_parser.parse)
     listener = Listener(on_press=hotkey.press, on_release=hotkey.release)
     listener.start()
 
+    # Also prints analysis after every change of figures
+    if watcher is not None:
+        threading.Thread(target=chess_parser.watch, args=(0.5, watcher), daemon=True).start()
+
     # Waits forever for listener to end
     listener.join()
 
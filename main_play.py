@@ -1,16 +1,18 @@
 import threading
-from typing import Callable
-
-from pynput.keyboard import HotKey, Listener
-from selenium.webdriver.remote.webdriver import WebDriver
+from typing import Callable, Optional, TYPE_CHECKING
 
 from parsing import ChessParser
 from parsing_functions import (chess_com_authorization, chess_com_pvp_parse, chess_com_bot_parse,
-                               chess_com_universal_parser)
+                               chess_com_universal_parser, BoardWatcher)
 from player import ChessComPlayer
 
+if TYPE_CHECKING:
+    from pynput.keyboard import Listener
+    from selenium.webdriver.remote.webdriver import WebDriver
+
 
-def create_hotkey(key: str, func: Callable) -> Listener:
+def create_hotkey(key: str, func: Callable) -> "Listener":
+    from pynput.keyboard import HotKey, Listener
     start = HotKey(HotKey.parse(key), func)
     start_listener = Listener(on_press=start.press, on_release=start.release)
     return start_listener
@@ -18,10 +20,11 @@ def create_hotkey(key: str, func: Callable) -> Listener:
 
 def run(url: str, move_hotkey: str, username: str, password: str, parse_func=chess_com_universal_parser) -> None:
 
-    def auth(driver: WebDriver) -> None:
+    def auth(driver: "WebDriver") -> None:
         chess_com_authorization(driver, username, password)
 
     chess_player = ChessComPlayer(ChessParser(url, parse_func=parse_func, authorization=auth))
+    chess_player.parser.open()
 
     listener = create_hotkey(move_hotkey, chess_player.move)
     listener.start()
@@ -31,15 +34,17 @@ def run(url: str, move_hotkey: str, username: str, password: str, parse_func=che
 
 
 def run_with_autoplay(url: str, start_hotkey: str, stop_hotkey: str, username: str, password: str,
-                      parse_func=chess_com_universal_parser) -> None:
+                      parse_func=chess_com_universal_parser, interval: float = 5,
+                      watcher: Optional[BoardWatcher] = None) -> None:
 
-    def auth(driver: WebDriver) -> None:
+    def auth(driver: "WebDriver") -> None:
         chess_com_authorization(driver, username, password)
 
     chess_player = ChessComPlayer(ChessParser(url, parse_func=parse_func, authorization=auth))
+    chess_player.parser.open()
 
     def start_autoplay() -> None:
-        autoplay = threading.Thread(target=chess_player.eternal_movement, args=(5,))
+        autoplay = threading.Thread(target=chess_player.eternal_movement, args=(interval, watcher))
         autoplay.start()
 
     start_listener = create_hotkey(start_hotkey, start_autoplay)
@@ -0,0 +1,112 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from console_chess_imandyr.base import Table
+from console_chess_imandyr.bot import Bot, Move
+
+from board import CompactBoard
+
+
+cost_entry = tuple[tuple[int, int], tuple[int, int], int]
+
+
+def zobrist_hash(table: Table, goes_up: bool) -> int:
+    """
+    Calculates Zobrist hash of the figures placement on a table.
+    :param table: Table with figures.
+    :param goes_up: Side to move, True for the player whose figures go up (white).
+    :return: 64-bit integer hash.
+    """
+    return CompactBoard.from_table(table).zobrist(goes_up)
+
+
+class MoveCostCache:
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None) -> None:
+        """
+        LRU cache of bots move costs keyed by Zobrist hash of the position and side to move.
+        :param maxsize: Maximal number of positions stored in the cache.
+        :param path: Path to a file in which cache will be persisted between sessions. Cache is loaded from it
+         on initialization if this file exists and saved to it on call of .save() method.
+
+        Entries are read and changed under a lock, because one cache can be shared by parsers in different threads.
+        """
+        self.maxsize, self.path = maxsize, path
+        self.hits, self.misses = 0, 0
+        self._entries: OrderedDict[int, list[cost_entry]] = OrderedDict()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: int) -> Optional[list[cost_entry]]:
+        """ Returns cached move costs of position with given key or None. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: int, costs: list[cost_entry]) -> None:
+        """ Stores move costs of position with given key, evicting the least recently used position if full. """
+        with self._lock:
+            self._entries[key] = costs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def lookup(self, bot: Bot) -> Optional[list[Move]]:
+        """
+        Returns cached available moves costs of given bot or None if its position was not evaluated yet.
+        On a hit, cached moves are also set as the bot's own moves costs, so its .best_move
+        and .available_moves_costs will not evaluate the position again.
+        """
+        entry = self.get(zobrist_hash(bot.table, bot.goes_up))
+        if entry is not None:
+            moves = [Move(bot.table.get_figure(_from), to, cost=cost) for _from, to, cost in entry]
+            if all(move.figure is not None for move in moves):
+                self.hits += 1
+                bot._available_moves_costs = moves
+                return moves
+        self.misses += 1
+        return None
+
+    def store(self, bot: Bot, moves: list[Move]) -> None:
+        """ Stores evaluated moves costs of given bot. """
+        self.put(zobrist_hash(bot.table, bot.goes_up), [(move.figure.position, move.to, move.cost) for move in moves])
+
+    def moves_costs(self, bot: Bot) -> list[Move]:
+        """
+        Returns available moves costs of given bot, taking them from the cache if this position was already
+        evaluated and evaluating and storing them otherwise.
+        :param bot: Bot whose moves costs are requested.
+        :return: List of Move objects with their cost specified.
+        """
+        moves = self.lookup(bot)
+        if moves is None:
+            moves = bot.available_moves_costs
+            self.store(bot, moves)
+        return moves
+
+    def clear(self) -> None:
+        """ Removes all positions from the cache. """
+        with self._lock:
+            self._entries.clear()
+        self.hits, self.misses = 0, 0
+
+    def load(self, path: Optional[str] = None) -> None:
+        """ Loads cached positions from a file at path or self.path. """
+        with open(path or self.path, "rb") as file:
+            for key, costs in pickle.load(file).items():
+                self.put(key, costs)
+
+    def save(self, path: Optional[str] = None) -> None:
+        """ Saves cached positions to a file at path or self.path. """
+        with open(path or self.path, "wb") as file:
+            with self._lock:
+                entries = dict(self._entries)
+            pickle.dump(entries, file)
@@ -0,0 +1,222 @@
+import re
+from typing import Iterable, Iterator, Optional, TextIO
+
+from console_chess_imandyr.base import Figure
+from console_chess_imandyr.figures import Pawn, Rook, King
+
+from parsing_functions import ChessSetBot, tune_pawns, piece_dict, piece_dict_rev
+
+
+start_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+san_pattern = re.compile(r"(?P<piece>[NBRQK])?(?P<file>[a-h])?(?P<rank>[1-8])?(?P<capture>x)?"
+                         r"(?P<to>[a-h][1-8])(?:=?(?P<promotion>[NBRQ]))?")
+tag_pattern = re.compile(r'\[(?P<name>\w+)\s+"(?P<value>(?:[^"\\]|\\.)*)"\]')
+move_number_pattern = re.compile(r"\d+\.+")
+results = {"1-0", "0-1", "1/2-1/2", "*"}
+
+
+class NotationError(ValueError):
+    """ Can be raised if FEN or PGN can't be converted into chess figures and moves. """
+
+
+def from_square(square: str) -> tuple[int, int]:
+    """ Converts algebraic square name (like "e4") into console_chess_imandyr position. """
+    return 8 - int(square[1]), ord(square[0]) - ord("a")
+
+
+def to_square(position: tuple[int, int]) -> str:
+    """ Converts console_chess_imandyr position into algebraic square name. """
+    return f"{chr(ord('a') + position[1])}{8 - position[0]}"
+
+
+def fen_to_chess_set(fen: str) -> tuple[ChessSetBot, bool]:
+    """
+    Creates ChessSetBot with figures placed as in the given FEN string.
+    :param fen: FEN string. Only the figures placement and the side to move fields are used.
+    :return: Tuple with ChessSetBot and True if white moves next.
+    """
+    fields = fen.split()
+    rows = fields[0].split("/") if fields else []
+    if len(rows) != 8:
+        raise NotationError(f"Invalid FEN: '{fen}'.")
+    chess_set = ChessSetBot()
+    for row, line in enumerate(rows):
+        column = 0
+        for char in line:
+            if char.isdigit():
+                column += int(char)
+            elif char.lower() in piece_dict and char.lower() != "f" and column < 8:
+                player = chess_set.player_white if char.isupper() else chess_set.player_black
+                chess_set.table.set_figure(piece_dict[char.lower()](chess_set.table, player), (row, column))
+                column += 1
+            else:
+                raise NotationError(f"Invalid FEN: '{fen}'.")
+    tune_pawns(chess_set.table)
+    return chess_set, len(fields) < 2 or fields[1] == "w"
+
+
+def chess_set_to_fen(chess_set: ChessSetBot, goes_up: bool = True) -> str:
+    """ Converts figures placement of a ChessSetBot and the side to move into a shortened FEN string. """
+    rows = []
+    for row in chess_set.table:
+        line, empty = "", 0
+        for figure in row:
+            if figure is None:
+                empty += 1
+                continue
+            char = piece_dict_rev[type(figure)]
+            line += f"{empty or ''}{char.upper() if figure.player.goes_up else char}"
+            empty = 0
+        rows.append(line + f"{empty or ''}")
+    return f"{'/'.join(rows)} {'w' if goes_up else 'b'}"
+
+
+def _exposes_king(chess_set: ChessSetBot, figure: Figure, to: tuple[int, int]) -> bool:
+    """ Judges if the king of figure owner can be taken after this figure moves to the given position. """
+    table, players = chess_set.table.full_copy()
+    player = figure.player.find_copy_of_yourself(players)
+    moved = table.get_figure(figure.position)
+    table.set_figure(None, figure.position)
+    table.set_figure(moved, to)
+    table.reset()
+    kings = [f.position for f in player.figures if type(f) is King]
+    return any(k in player.available_moves_of_enemy for k in kings)
+
+
+def apply_san(chess_set: ChessSetBot, san: str, goes_up: bool) -> None:
+    """
+    Makes a move written in standard algebraic notation on the table of a ChessSetBot.
+    :param chess_set: ChessSetBot with figures.
+    :param san: Move in SAN, like "Nf3", "exd5", "O-O" or "e8=Q+".
+    :param goes_up: True if the move is made by white.
+    :return: None, the move is made on the given ChessSetBot.
+    """
+    table = chess_set.table
+    player = chess_set.player_white if goes_up else chess_set.player_black
+    san = san.rstrip("+#!?")
+    row = 7 if goes_up else 0
+
+    if san in {"O-O", "O-O-O", "0-0", "0-0-0"}:
+        king, rook = (6, 7) if len(san) == 3 else (2, 0)
+        king_f, rook_f = table.get_figure((row, 4)), table.get_figure((row, rook))
+        if not isinstance(king_f, King) or not isinstance(rook_f, Rook):
+            raise NotationError(f"Invalid castling: '{san}'.")
+        table.set_figure(None, (row, 4))
+        table.set_figure(None, (row, rook))
+        table.set_figure(king_f, (row, king))
+        table.set_figure(rook_f, (row, 5 if king == 6 else 3))
+        table.reset()
+        return
+
+    if (match := san_pattern.fullmatch(san)) is None:
+        raise NotationError(f"Invalid move: '{san}'.")
+    to = from_square(match["to"])
+    step = 1 if goes_up else -1
+
+    if match["piece"] is None:
+        if match["capture"]:
+            _from = (to[0] + step, ord(match["file"]) - ord("a"))
+        elif isinstance(table.get_figure((to[0] + step, to[1])), Pawn):
+            _from = (to[0] + step, to[1])
+        else:
+            _from = (to[0] + 2 * step, to[1])
+        figure = table.get_figure(_from) if 0 <= _from[0] < 8 else None
+        if not isinstance(figure, Pawn) or figure.player != player:
+            raise NotationError(f"Invalid move: '{san}'.")
+        if match["capture"] and table.get_figure(to) is None:
+            table.set_figure(None, (_from[0], to[1]))
+    else:
+        piece = piece_dict[match["piece"].lower()]
+        candidates = [f for f in player.figures if type(f) is piece and to in f.available_moves
+                      and (match["file"] is None or f.position[1] == ord(match["file"]) - ord("a"))
+                      and (match["rank"] is None or f.position[0] == 8 - int(match["rank"]))]
+        if len(candidates) > 1:
+            candidates = [f for f in candidates if not _exposes_king(chess_set, f, to)]
+        if len(candidates) != 1:
+            raise NotationError(f"Invalid move: '{san}'.")
+        figure = candidates[0]
+
+    table.set_figure(None, figure.position)
+    if match["promotion"]:
+        figure = piece_dict[match["promotion"].lower()](table, player)
+    elif isinstance(figure, Pawn):
+        figure.first_move = False
+    table.set_figure(figure, to)
+    table.reset()
+
+
+def _pgn_tokens(lines: Iterable[str]) -> Iterator[str]:
+    """ Splits PGN lines into tags and movetext tokens, skipping comments and variations. """
+    comment, variation = False, 0
+    for line in lines:
+        line = line.strip()
+        if line.startswith("%"):
+            continue
+        if not comment and variation == 0 and line.startswith("["):
+            yield line
+            continue
+        token = ""
+        for char in line + " ":
+            if comment:
+                comment = char != "}"
+            elif char == "{":
+                comment = True
+            elif char == ";":
+                break
+            elif char == "(":
+                variation += 1
+            elif char == ")":
+                variation = max(variation - 1, 0)
+            elif variation:
+                continue
+            elif char.isspace():
+                if token:
+                    yield token
+                token = ""
+            else:
+                token += char
+        if token:
+            yield token
+
+
+def read_pgn(file: TextIO) -> Iterator[tuple[dict[str, str], list[str]]]:
+    """
+    Lazily reads games from a PGN file, so only one game is kept in memory at a time.
+    :param file: Text file or stream with PGN games.
+    :return: Iterator of (tags, moves) tuples, where moves are in SAN.
+    """
+    tags, moves = {}, []
+    for token in _pgn_tokens(file):
+        if token.startswith("["):
+            if moves:
+                yield tags, moves
+                tags, moves = {}, []
+            if (tag := tag_pattern.fullmatch(token)) is not None:
+                tags[tag["name"]] = tag["value"]
+        elif token in results:
+            yield tags, moves
+            tags, moves = {}, []
+        elif not token.startswith("$"):
+            token = move_number_pattern.sub("", token)
+            if token:
+                moves.append(token)
+    if tags or moves:
+        yield tags, moves
+
+
+def replay(tags: dict[str, str], moves: list[str]) -> Iterator[tuple[int, Optional[str], ChessSetBot, bool]]:
+    """
+    Replays a game and yields every position of it, including the starting one.
+    Each yielded ChessSetBot is a new object, so it can be evaluated independently.
+    :param tags: PGN tags of the game. Start position is taken from the "FEN" tag if present.
+    :param moves: Moves of the game in SAN.
+    :return: Iterator of (ply, last move, chess set, True if white moves next) tuples.
+    """
+    fen = tags.get("FEN", start_fen)
+    chess_set, goes_up = fen_to_chess_set(fen)
+    yield 0, None, chess_set, goes_up
+    for ply, san in enumerate(moves, 1):
+        chess_set, _ = fen_to_chess_set(chess_set_to_fen(chess_set, goes_up))
+        apply_san(chess_set, san, goes_up)
+        goes_up = not goes_up
+        yield ply, san, chess_set, goes_up
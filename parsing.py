@@ -1,28 +1,50 @@
-from typing import Optional, Callable
+import heapq
+import threading
+from time import sleep
+from typing import Optional, Callable, Iterable, Union, TYPE_CHECKING
 
 from console_chess_imandyr.base import Table
-from selenium import webdriver
 from selenium.common import WebDriverException
-from selenium.webdriver.remote.webdriver import WebDriver
 from console_chess_imandyr.game import ChessSet
-from console_chess_imandyr.bot import Move
+from console_chess_imandyr.bot import Bot, Move
 
 from parsing_functions import (parse_function, authorization_function, output_function, chess_com_bot_parse,
-                               chess_com_moves_output, ChessNotFound, AuthorizationError, ChessSetBot)
+                               chess_com_moves_output, ChessNotFound, AuthorizationError, ChessSetBot,
+                               BoardWatcher, chess_com_board_watcher)
+from move_cache import MoveCostCache
+from evaluation import MoveEvaluator
+from attacks import TableEvaluator
+from search import TimedSearch, SearchResult, SearchState
+from instrumentation import StageTimer, metrics_callback, profile
+from driver_pool import DriverPool, start_chrome
+from book import MappedTable
+from session import GameSession
+from position_store import PositionStore
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
 
 
 class ChessParser:
-    def __init__(self, url: str = "https://www.chess.com/", driver: Optional[WebDriver] = None,
+    def __init__(self, url: str = "https://www.chess.com/", driver: Optional["WebDriver"] = None,
                  n_best: int = 3, n_worst: int = 3,
                  authorization: Optional[authorization_function] = None,
                  parse_func: Optional[parse_function] = None,
-                 output_func: Optional[output_function] = None) -> None:
+                 output_func: Optional[output_function] = None,
+                 cache: Optional[MoveCostCache] = None,
+                 evaluator: Union[MoveEvaluator, TableEvaluator, None] = None,
+                 time_budget: Optional[float] = None, max_depth: int = 8,
+                 instrument: bool = False, metrics: Optional[metrics_callback] = None,
+                 pool: Optional[DriverPool] = None, books: Iterable[MappedTable] = (),
+                 session: Optional[GameSession] = None, store: Optional[PositionStore] = None) -> None:
         """
         Chess parser class is used to open a given url in a driver, parse it on call of .parse() method using parse_func
         and then print the analysis of this chess situation.
 
         :param url: URL to the target website with chess game on it.
         :param driver: Selenium WebDriver instance through which this website will be used.
+         If None, it is borrowed from pool on the first use, or a new Chrome WebDriver is started on the first use
+         if pool is None too. So, a parser which only analyses given positions by .print_analysis() never starts it.
         :param n_best: Number of the best possible moves which will be displayed on parse.
         :param n_worst: Number of the worst possible moves which will be displayed on parse.
         :param authorization: Function for authorization on target website. Authorize if provided and
@@ -31,18 +53,74 @@ class ChessParser:
          to get chess figures and their positions, transforming them into ChessSet object for further analysis.
         :param output_func: The function which will be used to convert a list with figures moves into
         some string representation, which will be printed after parsing.
+        :param cache: Cache of moves costs, through which already evaluated positions will be taken
+         instead of evaluating them again. Positions are always evaluated if None.
+        :param evaluator: Evaluator which will evaluate moves of both players at once, like MoveEvaluator in its
+         executor or attacks.TableEvaluator with precomputed attack tables and costs shared between parses.
+         Moves are evaluated by the bots one player after another in the current thread if None.
+        :param time_budget: Time in seconds for the iterative deepening search of the best move by .search().
+         The best move is taken from HardBot costs without search if None.
+        :param max_depth: Maximal depth of the search.
+        :param instrument: Time stages of every parse and save metrics of the last one to .last_metrics.
+        :param metrics: Function which will be called with metrics dict after every parse. Enables instrument.
+         Stages of the parse given in .timings of the parsed set ("driver" and "board" for ChessComTableParser
+         and parsers which use it, like chess_com_universal_parser) are reported as parts of "parse".
+        :param pool: Pool of WebDriver sessions, from which the driver is borrowed. Authorization is made
+         by the pool, which reuses cookies of its other sessions.
+        :param books: Opening books, in which positions are looked up before evaluating them.
+         Moves of a position found in one of them are taken from it, with costs given by the book.
+        :param session: Game session, which is updated with every parsed position. It carries move history,
+         castling and en passant rights and first moves of pawns between positions, and its search state is
+         used by .search() unless another state is given.
+        :param store: Store of analysed positions, in which positions are looked up after the cache and to which
+         every evaluated position is appended.
         """
         self.url, self.authorization, self.n_best, self.n_worst = url, authorization, n_best, n_worst
-        if driver is None:
-            driver = webdriver.Chrome()
-        self.driver = driver
+        self.pool = pool
+        self._driver = driver
         if parse_func is None:
             parse_func = chess_com_bot_parse
         self.parse_func = parse_func
         if output_func is None:
             output_func = chess_com_moves_output
         self.output_func = output_func
-        self._start()
+        self.cache, self.evaluator, self.books, self.store = cache, evaluator, list(books), store
+        self.time_budget, self.max_depth = time_budget, max_depth
+        self.instrument, self.metrics = instrument or metrics is not None, metrics
+        self.last_metrics: Optional[dict] = None
+        # Source of moves of every bot of the last .moves_costs() call: cache, store, book or None if evaluated.
+        self.last_sources: list[object] = []
+        self.session = session
+        self.nodes = 0
+        self.watching = False
+        # Parses from hotkeys and from .watch() run in different threads, but share the driver and the parse_func
+        # state, so they are made one at a time.
+        self._lock = threading.RLock()
+        if self._driver is not None:
+            self._start()
+
+    @property
+    def driver(self) -> "WebDriver":
+        """
+        WebDriver in which the url is opened. Borrowed from the pool or started on the first use if not given.
+        """
+        if self._driver is None:
+            if self.pool is not None:
+                self._driver = self.pool.acquire(self.url, self.authorization)
+            else:
+                self._driver = start_chrome()
+                self._start()
+        return self._driver
+
+    def open(self) -> "WebDriver":
+        """ Starts or borrows the driver right away, opening url in it, instead of waiting for its first use. """
+        return self.driver
+
+    def release(self, broken: bool = False) -> None:
+        """ Returns the driver to the pool, if it was borrowed from it. Next use will borrow a driver again. """
+        if self.pool is not None and self._driver is not None:
+            self.pool.release(self._driver, broken)
+            self._driver = None
 
     def _start(self) -> None:
         """ Opens url in a driver and authorize on website. """
@@ -62,38 +140,213 @@ class ChessParser:
         :param parse_func: Function which will be used instead of current self.parse_func if specified.
         :return: None
         """
-        parse_func = parse_func or self.parse_func
-        try:
-            chess_set = parse_func(self.driver)
-
-            def add_con(x):
-                return add_content(chess_set.table, x)
+        with self._lock:
+            self._parse(parse_func or self.parse_func)
 
-            white_moves = map(add_con, self.truncate_moves(chess_set.player_white.available_moves_costs))
-            black_moves = map(add_con, self.truncate_moves(chess_set.player_black.available_moves_costs))
-            print(f"White's moves costs: {self.output_func(white_moves)}\n"
-                  f"Black's moves costs: {self.output_func(black_moves)}")
+    def _parse(self, parse_func: parse_function) -> None:
+        timer, nodes = StageTimer(self.instrument), self.nodes
+        cache = (self.cache.hits, self.cache.misses) if self.cache is not None else (0, 0)
+        try:
+            with timer.stage("parse"):
+                chess_set = self._track(parse_func(self.driver))
+            timer.add(getattr(chess_set, "timings", {}))
+            self.print_analysis(chess_set, timer)
 
         except ChessNotFound as err:
             print(err)
 
         except WebDriverException:
             print("An exception occurred when a parsing function tried to parse the page.")
+            if self.pool is not None and self._driver is not None and not self.pool.healthy(self._driver):
+                self.release(broken=True)
+
+        if self.instrument:
+            self.report(timer.metrics(self.nodes - nodes, self.cache, cache))
+
+    def print_analysis(self, chess_set: ChessSetBot, timer: Optional[StageTimer] = None) -> None:
+        """
+        Prints analysis of a given position, without using the driver.
+        :param chess_set: Position to analyse.
+        :param timer: Timer of the current parse, to which stages are added. If None, new timer is used and
+         its metrics are reported.
+        :return: None
+        """
+        own_timer, nodes = timer is None, self.nodes
+        cache = (self.cache.hits, self.cache.misses) if self.cache is not None else (0, 0)
+        timer = timer or StageTimer(self.instrument)
+        with timer.stage("table"):
+            table = chess_set.table
+
+        def add_con(x):
+            return add_content(table, x)
+
+        with timer.stage("evaluate"):
+            white_moves, black_moves = self.moves_costs(chess_set.player_white, chess_set.player_black)
+        with timer.stage("output"):
+            lines = []
+            for name, moves, source in zip(("White", "Black"), (white_moves, black_moves), self.last_sources):
+                # Costs of book moves are not HardBot costs, so they are shown apart, without the worst moves.
+                if getattr(source, "book", False):
+                    moves = truncate_moves(moves, self.n_best + self.n_worst, 0)
+                    lines.append(f"{name}'s book moves: {self.output_func(map(add_con, moves))}")
+                else:
+                    lines.append(f"{name}'s moves costs: {self.output_func(map(add_con, self.truncate_moves(moves)))}")
+            print("\n".join(lines))
+        if own_timer and self.instrument:
+            self.report(timer.metrics(self.nodes - nodes, self.cache, cache))
+
+    def parse_if_changed(self, watcher: BoardWatcher = chess_com_board_watcher,
+                         parse_func: Optional[parse_function] = None) -> bool:
+        """ Calls .parse() only if watcher detected a change of figures since the last check. Returns if it did. """
+        with self._lock:
+            if watcher.changed(self.driver):
+                self.parse(parse_func)
+                return True
+            return False
+
+    def watch(self, interval: float = 0.5, watcher: BoardWatcher = chess_com_board_watcher) -> None:
+        """
+        Checks for changes of figures every interval while "self.watching" is True,
+        and prints analysis after each change.
+        :param interval: Waiting interval between checks.
+        :param watcher: Watcher which detects changes of figures.
+        :return: None
+        """
+        self.watching = True
+        while self.watching:
+            self.parse_if_changed(watcher)
+            sleep(interval)
+
+    def report(self, metrics: dict) -> None:
+        """ Saves metrics as the last ones and passes them to self.metrics if provided. """
+        self.last_metrics = metrics
+        if self.metrics is not None:
+            self.metrics(metrics)
+
+    def profile_parse(self, path: Optional[str] = None, parse_func: Optional[parse_function] = None) -> None:
+        """ Calls .parse() under cProfile and prints its top functions or dumps the profile to a path. """
+        profile(lambda: self.parse(parse_func), path)
+
+    def _track(self, chess_set: ChessSetBot) -> ChessSetBot:
+        """ Updates self.session with a parsed position, if the session is provided. """
+        if self.session is not None:
+            self.session.update(chess_set)
+        return chess_set
 
     def use_parse_func(self) -> ChessSetBot:
         """ Uses self.parse_func and returns its output. """
-        return self.parse_func(self.driver)
+        with self._lock:
+            return self._track(self.parse_func(self.driver))
+
+    def moves_costs(self, *bots: Bot) -> list[list[Move]]:
+        """
+        Returns available moves costs of given bots. Every bot is looked up in self.cache, self.store and self.books
+        in this order, and evaluated, using self.evaluator if provided, only if it is not found in any of them.
+        Evaluated moves are added to self.cache and self.store. Source of moves of every bot is kept in .last_sources.
+        """
+        sources = [i for i in (self.cache, self.store, *self.books) if i is not None]
+        costs: list[Optional[list[Move]]] = [None] * len(bots)
+        self.last_sources = [None] * len(bots)
+        for c, bot in enumerate(bots):
+            for source in sources:
+                # Books are given the session, so positions are looked up with its tracked rights.
+                costs[c] = source.lookup(bot, self.session) if source in self.books else source.lookup(bot)
+                if costs[c] is not None:
+                    self.last_sources[c] = source
+                    break
+        missing = [bot for bot, moves in zip(bots, costs) if moves is None]
+        fresh = [bot._available_moves_costs is None for bot in missing]
+        if self.evaluator is not None:
+            evaluated = self.evaluator.moves_costs(missing)
+        else:
+            evaluated = [bot.available_moves_costs for bot in missing]
+        self.nodes += sum(len(moves) for moves, new in zip(evaluated, fresh) if new)
+        evaluated = iter(evaluated)
+        for c, (bot, moves) in enumerate(zip(bots, costs)):
+            if moves is None:
+                costs[c] = next(evaluated)
+                for target in (self.cache, self.store):
+                    if target is not None:
+                        target.store(bot, costs[c])
+        return costs
 
-    def truncate_moves(self, moves: list[Move]) -> list[Move]:
+    def search(self, bot: Bot, time_budget: Optional[float] = None,
+               state: Optional[SearchState] = None) -> SearchResult:
+        """
+        Searches the best move of a bot within time_budget or self.time_budget seconds.
+        Raises ValueError if both of them are None.
+        """
+        time_budget = time_budget or self.time_budget
+        if time_budget is None:
+            raise ValueError("Search needs a time budget, but neither time_budget nor self.time_budget is set.")
+        if state is None and self.session is not None:
+            state = self.session.state
+        return TimedSearch(time_budget, self.max_depth, state)(bot)
+
+    def truncate_moves(self, moves: Iterable[Move]) -> list[Move]:
         """ Return n_best and n_worst moves from a list of moves. """
-        moves.sort(key=lambda x: x.cost, reverse=True)
-        if len(moves) <= self.n_best + self.n_worst:
-            return moves
-        output = moves[:self.n_best]
-        output.extend(moves[-self.n_worst:])
-        return output
+        return truncate_moves(moves, self.n_best, self.n_worst)
+
+
+class MoveSelector:
+    def __init__(self, n_best: int = 3, n_worst: int = 3) -> None:
+        """
+        Selects n_best and n_worst moves from moves added one by one, keeping only them in memory.
+        Moves are ordered as in a list sorted by cost in descending order, where moves with equal costs
+        keep the order in which they were added.
+        :param n_best: Number of the best moves to select.
+        :param n_worst: Number of the worst moves to select.
+        """
+        self.n_best, self.n_worst = n_best, n_worst
+        self._count = 0
+        self._best: list[tuple[int, int, Move]] = []
+        self._worst: list[tuple[int, int, Move]] = []
+
+    def add(self, move: Move) -> None:
+        """ Adds one move to the selection. """
+        self._count += 1
+        if self.n_best > 0:
+            item = (move.cost, -self._count, move)
+            if len(self._best) < self.n_best:
+                heapq.heappush(self._best, item)
+            elif item[:2] > self._best[0][:2]:
+                heapq.heapreplace(self._best, item)
+        if self.n_worst > 0:
+            item = (-move.cost, self._count, move)
+            if len(self._worst) < self.n_worst:
+                heapq.heappush(self._worst, item)
+            elif item[:2] > self._worst[0][:2]:
+                heapq.heapreplace(self._worst, item)
+
+    def extend(self, moves: Iterable[Move]) -> "MoveSelector":
+        """ Adds all moves to the selection. """
+        for move in moves:
+            self.add(move)
+        return self
+
+    def result(self) -> list[Move]:
+        """ Returns selected moves, the best first. """
+        selected = {-count: (-cost, -count, move) for cost, count, move in self._best}
+        selected.update((count, (cost, count, move)) for cost, count, move in self._worst)
+        return [move for cost, count, move in sorted(selected.values(), key=lambda x: x[:2])]
+
+
+def truncate_moves(moves: Iterable[Move], n_best: int = 3, n_worst: int = 3) -> list[Move]:
+    """ Return n_best and n_worst moves from a list of moves, without changing the list. """
+    return MoveSelector(n_best, n_worst).extend(moves).result()
 
 
 def add_content(table: Table, move: Move) -> Move:
     """ Adds content to move if any. """
-    return Move(move.figure, move.to, table.get_figure(move.to), move.cost)
+    content = table.get_figure(move.to)
+    if content is move.content:
+        return move
+    return Move(move.figure, move.to, content, move.cost)
+
+
+def analyse(chess_set: ChessSetBot, n_best: int = 3, n_worst: int = 3,
+            output_func: output_function = chess_com_moves_output) -> dict[str, str]:
+    """ Returns output_func representations of n_best and n_worst moves of both players of a ChessSetBot. """
+    return {name: output_func(add_content(chess_set.table, move)
+                              for move in truncate_moves(bot.available_moves_costs, n_best, n_worst))
+            for name, bot in (("white", chess_set.player_white), ("black", chess_set.player_black))}
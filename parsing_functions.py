@@ -1,16 +1,22 @@
 from dataclasses import dataclass
-from typing import Callable, Optional, TypedDict, Iterable
+from typing import Callable, Optional, TypedDict, Iterable, TYPE_CHECKING
 import re
+import threading
+from time import perf_counter
 
 from selenium.common import WebDriverException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.common.keys import Keys
 from console_chess_imandyr.base import Table, Player, Figure
 from console_chess_imandyr.bot import Bot, HardBot, Move
 from console_chess_imandyr.game import ChessSet
 from console_chess_imandyr.figures import Pawn, Rook, Knight, Bishop, Queen, King
 
+from attacks import bot_moves_costs, reaches
+from board import CompactBoard, figure_code, pieces, piece_codes
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
 
 class ChessNotFound(ValueError):
     """ Can be raised if parse_function did not find any chess figures on the page. """
@@ -32,12 +38,59 @@ class ChessSetBot:
         self.player_white = self.player_white or HardBot(self.table, True, "White")
         self.player_black = self.player_black or HardBot(self.table, False, "Black")
 
+    def moves_costs(self, goes_up: bool) -> list[Move]:
+        """
+        Returns HardBot moves costs of the white (goes_up) or black bot, calculated with precomputed attack tables
+        on a compact board and cached by position, so the same position is evaluated only once for all parses.
+        """
+        return bot_moves_costs(self.player_white if goes_up else self.player_black)
+
 
-authorization_function = Callable[[WebDriver], None]
-parse_function = Callable[[WebDriver], ChessSetBot]
+class LazyChessSetBot(ChessSetBot):
+    def __init__(self, board: CompactBoard, factory: Callable[[], ChessSetBot] = ChessSetBot) -> None:
+        """
+        ChessSetBot which keeps figures in a compact board and creates the table with figures and bots
+        only on the first access to any of them.
+        :param board: Compact board with figures.
+        :param factory: Function which creates an empty ChessSetBot to be filled with figures from the board.
+        """
+        self.board = board
+        self.factory = factory
+        # Seconds spent by stages of the parse which returned this set, like "driver" and "board".
+        self.timings: dict[str, float] = {}
+        self._chess_set: Optional[ChessSetBot] = None
+
+    @property
+    def materialized(self) -> bool:
+        """ True if the table and bots were already created. """
+        return self._chess_set is not None
+
+    def _materialize(self) -> ChessSetBot:
+        if self._chess_set is None:
+            chess_set = self.factory()
+            self.board.fill(chess_set.table, chess_set.player_white, chess_set.player_black)
+            self._chess_set = chess_set
+        return self._chess_set
+
+    @property
+    def table(self) -> Table:
+        return self._materialize().table
+
+    @property
+    def player_white(self) -> Bot:
+        return self._materialize().player_white
+
+    @property
+    def player_black(self) -> Bot:
+        return self._materialize().player_black
+
+
+authorization_function = Callable[["WebDriver"], None]
+parse_function = Callable[["WebDriver"], ChessSetBot]
 output_function = Callable[[Iterable[Move]], str]
 
 
+class_attribute_pattern = re.compile(r"""class=["'](?P<class>piece [^"']*)["']""")
 figure_pattern = re.compile(r"piece (?P<color>\w)(?P<piece>\w) square-(?P<column>\d)(?P<row>\d)")
 piece_dict = {"r": Rook, "n": Knight, "b": Bishop, "k": King, "q": Queen, "p": Pawn, "f": Figure}
 piece_dict_rev = {v: k for k, v in piece_dict.items()}
@@ -65,17 +118,52 @@ def tune_pawns(table: Table) -> None:
                 f.first_move = False
 
 
+def figure_reaches(figure: Figure, position: tuple[int, int]) -> bool:
+    """
+    Judges if the available moves of a figure may depend on the content of a given table square.
+    Check is purely geometric and uses precomputed tables, so it can be true for squares which are blocked
+    by other figures.
+    :param figure: Figure placed on a table.
+    :param position: Position of the square.
+    :return: True if a change on the square may change figure moves.
+    """
+    square = figure.position[0] * 8 + figure.position[1]
+    return position[0] * 8 + position[1] in reaches[piece_codes.get(type(figure), 0)][square]
+
+
+class_names_script = """
+const found = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const classes = [];
+for (let i = 0; i < found.snapshotLength; i++) {
+    classes.push(found.snapshotItem(i).getAttribute("class") || "");
+}
+return classes;
+"""
+
+
 class ChessComTableParser:
-    def __init__(self, xpath: str, doc: str) -> None:
+    def __init__(self, xpath: str, doc: str, bulk: bool = True, incremental: bool = True) -> None:
         """
         Creates a parser object, which will parse figures from the page of https://www.chess.com/
         on call, using xpath given on initialization.
         :param xpath: Xpath string by which page elements with figures properties will be selected.
         :param doc: Docstring of a newly created object.
+        :param bulk: Extract class names of all figures with one execute_script call instead of
+         one WebDriver call per figure. Falls back to the per-element extraction if the script fails.
+        :param incremental: Keep the last parsed ChessSetBot of every driver and on the next call with
+         the same driver apply to it only the figures which changed since then, instead of creating a new one.
+
+        Figures are parsed into a CompactBoard, and the returned LazyChessSetBot creates Figure objects
+        from it only when its table or bots are used. Timings of the parse stages are kept in its .timings,
+        and not in the parser, because one parser object is shared by all drivers and threads.
         """
         self.xpath = xpath
         self.__doc__ = doc
-        self._driver: Optional[WebDriver] = None
+        self.bulk = bulk
+        self.incremental = incremental
+        # The last parsed set of every driver as {id(driver): (driver, chess_set)}.
+        self._last: dict[int, tuple[object, LazyChessSetBot]] = {}
+        self._lock = threading.Lock()
 
     def _create_game_set(self) -> ChessSetBot:
         """ Creates a game set with table, white and black players. """
@@ -83,23 +171,74 @@ class ChessComTableParser:
         white, black = HardBot(table, True, "White"), HardBot(table, False, "Black")
         return ChessSetBot(table, white, black)
 
-    def __call__(self, driver: WebDriver) -> ChessSetBot:
+    def _class_names(self, driver: "WebDriver") -> list[str]:
+        """ Returns class names of all page elements selected by self.xpath. """
+        if self.bulk:
+            try:
+                class_names = driver.execute_script(class_names_script, self.xpath)
+                if isinstance(class_names, list):
+                    return class_names
+            except WebDriverException:
+                pass
+        return [element.get_attribute("class") or "" for element in driver.find_elements(By.XPATH, self.xpath)]
+
+    def _board(self, class_names: Iterable[str]) -> CompactBoard:
+        """ Creates a compact board with figures described by given class names. """
+        board = CompactBoard()
+        for figure in class_names:
+            if (figure := figure_pattern.match(figure)) is not None and figure["piece"] in pieces:
+                position = (8 - int(figure["row"]), int(figure["column"]) - 1)
+                board[position] = figure_code(figure["piece"], figure["color"] == "w", position)
+        return board
+
+    def _apply_diff(self, chess_set: LazyChessSetBot, board: CompactBoard) -> None:
+        """
+        Changes figures on the table of chess_set from its current board to a given one.
+        Cached moves of figures are reset only if they can reach one of the changed squares, while both bots
+        are reset on any change, because costs of their moves depend on all figures.
+        """
+        changed = chess_set.board.changed(board)
+        chess_set.board = board
+        if not changed or not chess_set.materialized:
+            return
+        table = chess_set.table
+        for position in changed:
+            table.set_figure(board.create_figure(position, table, chess_set.player_white, chess_set.player_black),
+                             position)
+
+        table._figures, table._players = None, None
+        for f in table.figures:
+            if f.position in changed or any(figure_reaches(f, p) for p in changed):
+                f.reset()
+        chess_set.player_white.reset()
+        chess_set.player_black.reset()
+
+    def __call__(self, driver: "WebDriver") -> ChessSetBot:
         """ Parses chess figures and positions from the currently opened page from https://www.chess.com/
         into ChessSetBot. """
-        self._driver = driver
-        chess_set = self._create_game_set()
-
-        for figure in driver.find_elements(By.XPATH, self.xpath):
-            if (figure := figure_pattern.match(figure.get_attribute("class"))) is not None:
-                figure = figure.groupdict()
-                chess_set.table.set_figure(piece_dict[figure["piece"]](chess_set.table,
-                                                                       chess_set.player_white
-                                                                       if figure["color"] == "w"
-                                                                       else chess_set.player_black),
-                                           (8 - int(figure["row"]), int(figure["column"]) - 1))
-        if len(chess_set.table.figures) == 0:
+        start = perf_counter()
+        class_names = self._class_names(driver)
+        extracted = perf_counter()
+        board = self._board(class_names)
+        timings = {"driver": extracted - start, "board": perf_counter() - extracted}
+        if not any(board.squares):
+            with self._lock:
+                self._last.pop(id(driver), None)
             raise ChessNotFound("The parsing function did not find any chess figures on the page.")
-        tune_pawns(chess_set.table)
+        if not self.incremental:
+            chess_set = LazyChessSetBot(board, self._create_game_set)
+            chess_set.timings = timings
+            return chess_set
+
+        with self._lock:
+            last = self._last.get(id(driver))
+            if last is not None and last[0] is driver:
+                chess_set = last[1]
+                self._apply_diff(chess_set, board)
+            else:
+                chess_set = LazyChessSetBot(board, self._create_game_set)
+                self._last[id(driver)] = (driver, chess_set)
+            chess_set.timings = timings
         return chess_set
 
 
@@ -132,7 +271,82 @@ chess_com_pvp_parse = ChessComTableParser(
 )
 
 
-def chess_com_universal_parser(driver: WebDriver) -> ChessSetBot:
+class SnapshotTableParser(ChessComTableParser):
+    def __init__(self, doc: str, incremental: bool = False) -> None:
+        """
+        Creates a parser object, which will parse figures from saved HTML of a https://www.chess.com/ page
+        or from class names of its figure elements, without any WebDriver.
+        :param doc: Docstring of a newly created object.
+        :param incremental: Same as in ChessComTableParser, but a diff is applied only if the same
+         snapshot object is given again.
+        """
+        super().__init__("", doc, False, incremental)
+
+    def _class_names(self, snapshot: str | Iterable[str]) -> list[str]:
+        """ Returns class names of all figure elements from HTML string or a given iterable of class names. """
+        if isinstance(snapshot, str):
+            return [match["class"] for match in class_attribute_pattern.finditer(snapshot)]
+        return list(snapshot)
+
+
+chess_com_snapshot_parse = SnapshotTableParser(
+    " Parses chess figures and positions from saved HTML of a page from https://www.chess.com/ "
+    "or from a list of class names of its figure elements. "
+)
+
+
+board_watch_script = """
+for (const xpath of arguments[0]) {
+    const board = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!board) continue;
+    if (board.chessParserVersion === undefined) {
+        const isPiece = node => node.classList !== undefined && node.classList.contains("piece");
+        board.chessParserId = Math.random().toString(36).slice(2);
+        board.chessParserVersion = 0;
+        new MutationObserver(records => {
+            if (records.some(r => r.type === "attributes" ? isPiece(r.target)
+                             : [...r.addedNodes, ...r.removedNodes].some(isPiece))) {
+                board.chessParserVersion++;
+            }
+        }).observe(board, {childList: true, subtree: true, attributes: true, attributeFilter: ["class"]});
+    }
+    return board.chessParserId + ":" + board.chessParserVersion;
+}
+return null;
+"""
+
+
+class BoardWatcher:
+    def __init__(self, xpaths: Iterable[str]) -> None:
+        """
+        Detects changes of figures on a board, using MutationObserver injected into the page.
+        Each check is a single execute_script call, which does not read any figures.
+        :param xpaths: Xpath strings of board containers, the first found one is watched.
+        """
+        self.xpaths = list(xpaths)
+        self._versions: dict[int, Optional[str]] = {}
+
+    def changed(self, driver: "WebDriver") -> bool:
+        """
+        Returns True if figures on the board changed since the previous call with the same driver,
+        and on the first call with a board. A page without a board is not a change, so nothing is parsed
+        until a board appears. Only if scripts can't be executed, True is returned on every call,
+        so the caller can fall back to parsing.
+        """
+        try:
+            version = driver.execute_script(board_watch_script, self.xpaths)
+        except WebDriverException:
+            self._versions.pop(id(driver), None)
+            return True
+        previous = self._versions.get(id(driver))
+        self._versions[id(driver)] = version
+        return version is not None and version != previous
+
+
+chess_com_board_watcher = BoardWatcher(['//*[@id="board-single"]', '//*[@id="board-play-computer"]'])
+
+
+def chess_com_universal_parser(driver: "WebDriver") -> ChessSetBot:
     """ Universal parser, which can parse both PvP and PvB. """
     try:
         return chess_com_pvp_parse(driver)
@@ -140,7 +354,7 @@ def chess_com_universal_parser(driver: WebDriver) -> ChessSetBot:
         return chess_com_bot_parse(driver)
 
 
-def chess_com_authorization(driver: WebDriver, username: str, password: str) -> None:
+def chess_com_authorization(driver: "WebDriver", username: str, password: str) -> None:
     """ Authorizes on https://www.chess.com/ using given username and password. """
     prev_url = driver.current_url
     login_url = "https://www.chess.com/login_and_go?"
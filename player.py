@@ -4,41 +4,61 @@ from abc import ABC, abstractmethod
 
 from console_chess_imandyr.base import Figure
 from console_chess_imandyr.bot import Move
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import WebDriverException
 
 from parsing import ChessParser, add_content
-from parsing_functions import to_chess_com, chess_com_moves_output, piece_dict_rev
+from search import SearchResult
+from instrumentation import StageTimer
+from parsing_functions import to_chess_com, chess_com_moves_output, piece_dict_rev, BoardWatcher
 
 
 class ChessPlayer(ABC):
-    def __init__(self, parser: Optional[ChessParser] = None) -> None:
+    def __init__(self, parser: Optional[ChessParser] = None, time_budget: Optional[float] = None) -> None:
         """
         Chess player is making moves in webpage opened in parser. Call .move() method to make move.
         :param parser: ChessParser object which will open a webpage with chess game and parse it.
+        :param time_budget: Time in seconds for the search of the best move. Parser's time_budget is used if None,
+         and if it is None too, the best move is taken from HardBot costs without search.
         """
         self.autoplay: bool = False
+        self.time_budget = time_budget
+        self.last_search: Optional[SearchResult] = None
         if parser is None:
             parser = ChessParser()
         self.parser = parser
 
     def get_best_move(self) -> Move:
         """ Returns best possible move. """
-        chess_set = self.parser.use_parse_func()
-        try:
-            player_c = self.parser.driver.find_element(
-                By.XPATH, '//*[@id="board-layout-player-bottom"]/div/div[2]/wc-captured-pieces'
-            ).get_attribute("player-color")
-            if player_c == "2":
-                best = chess_set.player_black.best_move
+        timer, nodes = StageTimer(self.parser.instrument), self.parser.nodes
+        cache = self.parser.cache
+        cache_before = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        with timer.stage("parse"):
+            chess_set = self.parser.use_parse_func()
+        timer.add(getattr(chess_set, "timings", {}))
+        with timer.stage("color"):
+            try:
+                player_c = self.parser.driver.find_element(
+                    By.XPATH, '//*[@id="board-layout-player-bottom"]/div/div[2]/wc-captured-pieces'
+                ).get_attribute("player-color")
+                if player_c == "2":
+                    bot = chess_set.player_black
+                else:
+                    bot = chess_set.player_white
+            except WebDriverException:
+                bot = chess_set.player_white
+        searched, extra = 0, {}
+        with timer.stage("evaluate"):
+            if self.time_budget or self.parser.time_budget:
+                self.last_search = self.parser.search(bot, self.time_budget)
+                best = self.last_search.move
+                searched, extra = self.last_search.nodes, {"depth": self.last_search.depth}
             else:
-                best = chess_set.player_white.best_move
-        except WebDriverException:
-            best = chess_set.player_white.best_move
+                self.parser.moves_costs(bot)
+                best = bot.best_move
         best = add_content(chess_set.table, best)
+        if self.parser.instrument:
+            self.parser.report(timer.metrics(self.parser.nodes - nodes + searched, cache, cache_before, **extra))
         return best
 
     @abstractmethod
@@ -49,15 +69,18 @@ class ChessPlayer(ABC):
         """ Makes one move. """
         print(chess_com_moves_output([self.make_move()]))
 
-    def eternal_movement(self, interval: float) -> None:
+    def eternal_movement(self, interval: float, watcher: Optional[BoardWatcher] = None) -> None:
         """
         Endlessly calls .move() every interval while "self.autoplay" is True.
         :param interval: Waiting interval.
+        :param watcher: If provided, .move() is called only when the watcher detects a change of figures,
+         so the board is checked every interval, but parsed and evaluated only after it changes.
         :return: None
         """
         self.autoplay = True
         while self.autoplay:
-            self.move()
+            if watcher is None or watcher.changed(self.parser.driver):
+                self.move()
             sleep(interval)
 
 
@@ -67,6 +90,7 @@ class ChessComPlayer(ChessPlayer):
         Makes the best possible move in the currently opened chess game and returns it.
         :return: The best move in Move object.
         """
+        from selenium.webdriver.common.action_chains import ActionChains
         move = self.get_best_move()
         try:
             figure_el = chess_com_element(move.figure)
@@ -0,0 +1,156 @@
+import mmap
+import os
+import struct
+from typing import Iterator, NamedTuple, Optional
+
+from console_chess_imandyr.bot import Bot, Move
+
+from board import CompactBoard, pieces, black_flag
+from move_cache import cost_entry
+
+
+header = struct.Struct(">Q64s?H")
+move_record = struct.Struct(">BBi")
+
+
+class StoredPosition(NamedTuple):
+    """ Position read from a PositionStore. """
+    key: int
+    board: CompactBoard
+    goes_up: bool
+    costs: list[cost_entry]
+
+
+def material_signature(board: CompactBoard) -> str:
+    """ Returns material of both sides as a string like "KQRRBNPPPPPvKRRBBPPPPPP", white before black. """
+    counts = [0] * 16
+    for position, code in board.figures():
+        counts[code & (7 | black_flag)] += 1
+    return "v".join("".join(pieces[code - 1].upper() * counts[code | color] for code in (6, 5, 4, 3, 2, 1))
+                    for color in (0, black_flag))
+
+
+class PositionStore:
+    def __init__(self, path: str, read_only: bool = False) -> None:
+        """
+        Append-only file of analysed positions with their moves costs, which is memory-mapped for reading.
+
+        Every record is a header with the Zobrist hash of the position, its CompactBoard bytes, the side to move
+        and the number of moves, followed by (from square, to square, cost) of every move.
+        Index by hash and by material signature is built by one scan of the file on opening.
+        Records are only appended, the first record of a position wins, and a partially written record
+        at the end of the file is cut off by the writer. A read-only store skips it without changing the file,
+        because it may be a record which the writer is appending at the moment.
+
+        :param path: Path to the store file. It is created if it does not exist, unless the store is read-only.
+        :param read_only: Open the file only for reading, for processes which share it with one writer.
+        """
+        self.path, self.read_only = path, read_only
+        self.hits, self.misses = 0, 0
+        self._index: dict[int, int] = {}
+        self._signatures: dict[str, list[int]] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._file = open(path, "rb" if read_only else "a+b")
+        self._scan()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._index
+
+    def _view(self) -> Optional[mmap.mmap]:
+        """ Returns memory map of the whole file, mapping it again if records were appended since. """
+        if not self.read_only:
+            self._file.flush()
+        size = os.fstat(self._file.fileno()).st_size
+        if size and (self._map is None or len(self._map) < size):
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _scan(self) -> None:
+        view, offset = self._view(), 0
+        size = len(view) if view is not None else 0
+        while offset + header.size <= size:
+            key, board, goes_up, count = header.unpack_from(view, offset)
+            end = offset + header.size + count * move_record.size
+            if end > size:
+                break
+            self._add(key, board, offset)
+            offset = end
+        if offset < size and not self.read_only:
+            self._map.close()
+            self._map = None
+            self._file.truncate(offset)
+
+    def _add(self, key: int, board: bytes, offset: int) -> None:
+        if key not in self._index:
+            self._index[key] = offset
+            self._signatures.setdefault(material_signature(CompactBoard(board)), []).append(offset)
+
+    def _read(self, offset: int) -> StoredPosition:
+        view = self._view()
+        key, board, goes_up, count = header.unpack_from(view, offset)
+        costs = [(divmod(_from, 8), divmod(to, 8), cost)
+                 for _from, to, cost in move_record.iter_unpack(view[offset + header.size:
+                                                                     offset + header.size + count * move_record.size])]
+        return StoredPosition(key, CompactBoard(board), goes_up, costs)
+
+    def get(self, key: int) -> Optional[StoredPosition]:
+        """ Returns stored position with given key or None. """
+        offset = self._index.get(key)
+        return self._read(offset) if offset is not None else None
+
+    def put(self, board: CompactBoard, goes_up: bool, costs: list[cost_entry]) -> int:
+        """ Appends a position with its moves costs if it is not stored yet. Returns its key. """
+        if self.read_only:
+            raise ValueError(f"Position store {self.path} is opened read-only.")
+        key = board.zobrist(goes_up)
+        if key not in self._index:
+            self._file.seek(0, 2)
+            offset = self._file.tell()
+            self._file.write(header.pack(key, bytes(board), goes_up, len(costs)) + b"".join(
+                move_record.pack(_from[0] * 8 + _from[1], to[0] * 8 + to[1], cost) for _from, to, cost in costs))
+            self._file.flush()
+            self._add(key, bytes(board), offset)
+        return key
+
+    def positions(self, signature: Optional[str] = None) -> Iterator[StoredPosition]:
+        """ Yields stored positions in the order of writing, only the ones with given material signature if set. """
+        offsets = self._signatures.get(signature, []) if signature is not None else sorted(self._index.values())
+        for offset in offsets:
+            yield self._read(offset)
+
+    def signatures(self) -> dict[str, int]:
+        """ Returns numbers of stored positions by material signature. """
+        return {signature: len(offsets) for signature, offsets in self._signatures.items()}
+
+    def lookup(self, bot: Bot) -> Optional[list[Move]]:
+        """
+        Returns stored available moves costs of given bot or None if its position is not stored.
+        On a hit, moves are also set as the bot's own moves costs. The stored board is compared with the bot's one,
+        so a collision of Zobrist keys is a miss and not costs of another position.
+        """
+        board = CompactBoard.from_table(bot.table)
+        position = self.get(board.zobrist(bot.goes_up))
+        if position is not None and position.board == board:
+            moves = [Move(bot.table.get_figure(_from), to, cost=cost) for _from, to, cost in position.costs]
+            if all(move.figure is not None for move in moves):
+                self.hits += 1
+                bot._available_moves_costs = moves
+                return moves
+        self.misses += 1
+        return None
+
+    def store(self, bot: Bot, moves: list[Move]) -> None:
+        """ Appends evaluated moves costs of given bot. """
+        self.put(CompactBoard.from_table(bot.table), bot.goes_up,
+                 [(move.figure.position, move.to, move.cost) for move in moves])
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
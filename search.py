@@ -0,0 +1,146 @@
+import random
+from time import monotonic
+from typing import NamedTuple, Optional, Union, cast
+
+from console_chess_imandyr.bot import Bot, HardBot, Move, cost_of_figure, get_all_items_with_highest_value
+
+from attacks import costs as figure_costs, move_cost, move_list
+from board import CompactBoard
+
+
+move_key = tuple[tuple[int, int], tuple[int, int]]
+
+
+class SearchTimeout(Exception):
+    """ Raised inside of the search when its deadline is reached. """
+
+
+class SearchResult(NamedTuple):
+    """ Result of a time-budgeted search. """
+    move: Optional[Move]
+    moves: list[Move]
+    depth: int
+    nodes: int
+    elapsed: float
+
+
+class SearchState:
+    def __init__(self) -> None:
+        """
+        Move ordering heuristics of the search, which can be kept between searches of consecutive positions.
+        history - score of every (from, to) move which caused a cutoff, killers - last two such moves of every depth.
+        Moves can be given both as Move objects and as (from, to) tuples.
+        """
+        self.history: dict[move_key, int] = {}
+        self.killers: dict[int, list[move_key]] = {}
+
+    @staticmethod
+    def _key(move: Union[Move, move_key]) -> move_key:
+        return (move.figure.position, move.to) if isinstance(move, Move) else move
+
+    def order(self, moves: list, depth: int) -> list:
+        """ Returns moves sorted by killers of the depth first and then by their history score. """
+        killers = self.killers.get(depth, [])
+        return sorted(moves, key=lambda m: (self._key(m) in killers, self.history.get(self._key(m), 0)), reverse=True)
+
+    def cutoff(self, move: Union[Move, move_key], depth: int) -> None:
+        """ Remembers a move which caused a cutoff on the depth. """
+        key = self._key(move)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+        killers = self.killers.setdefault(depth, [])
+        if key not in killers:
+            killers.insert(0, key)
+            del killers[2:]
+
+
+class TimedSearch:
+    def __init__(self, time_budget: float, max_depth: int = 8, state: Optional[SearchState] = None) -> None:
+        """
+        Iterative deepening search of the best move, which stops when time budget runs out.
+
+        Depth 1 costs are the same as HardBot costs. On every next depth, a move costs the enemy figure
+        which it kills minus the cost of the best enemy reply searched one depth less.
+
+        :param time_budget: Maximal time of the search in seconds.
+        :param max_depth: Search stops after this depth even if time is left.
+        :param state: Move ordering heuristics, which will be updated by the search. New if None.
+        """
+        self.time_budget, self.max_depth = time_budget, max_depth
+        self.state = state or SearchState()
+        self.nodes = 0
+        self._deadline = 0.
+
+    def _check(self) -> None:
+        self.nodes += 1
+        if monotonic() > self._deadline:
+            raise SearchTimeout()
+
+    def _negamax(self, board: CompactBoard, goes_up: bool, depth: int, alpha: float, beta: float) -> float:
+        """ Returns cost of the best move of the player in a position of the board. """
+        self._check()
+        moves = self.state.order(move_list(board, goes_up), depth)
+        if not moves:
+            return 0
+        best = float("-inf")
+        for move in moves:
+            if depth == 1:
+                self._check()
+                value = move_cost(board, goes_up, *move)
+            else:
+                gain = figure_costs[board[move[1]] & 7]
+                child = board.copy()
+                child.move(*move)
+                value = gain - self._negamax(child, not goes_up, depth - 1, gain - beta, gain - alpha)
+            best = max(best, value)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.state.cutoff(move, depth)
+                break
+        return best
+
+    def _root(self, bot: HardBot, moves: list[Move], depth: int, order: list[int],
+              costs: dict[int, int]) -> None:
+        """ Calculates costs of all root moves on the depth into costs, in the given order of their indexes. """
+        board = CompactBoard.from_table(bot.table)
+        for i in order:
+            move = moves[i]
+            if depth == 1:
+                if costs:
+                    self._check()
+                else:
+                    self.nodes += 1
+                costs[i] = move_cost(board, bot.goes_up, move.figure.position, move.to)
+            else:
+                gain = cost_of_figure(bot.table.get_figure(move.to))
+                child = board.copy()
+                child.move(move.figure.position, move.to)
+                costs[i] = gain - self._negamax(child, not bot.goes_up, depth - 1, float("-inf"), float("inf"))
+
+    def __call__(self, bot: Bot) -> SearchResult:
+        """
+        Searches the best move of a bot until time budget runs out or max_depth is reached.
+        :param bot: HardBot, whose move will be searched.
+        :return: SearchResult with the best move, all moves with costs of the last completed depth
+         (or the moves evaluated so far, if even depth 1 was not completed), achieved depth,
+         number of searched nodes and elapsed time.
+        """
+        start = monotonic()
+        self._deadline, self.nodes = start + self.time_budget, 0
+        bot = cast(HardBot, bot)
+        moves = bot.available_moves
+        order, depth, costs = list(range(len(moves))), 0, {}
+
+        for d in range(1, self.max_depth + 1):
+            current: dict[int, int] = {}
+            try:
+                self._root(bot, moves, d, order, current)
+            except SearchTimeout:
+                if depth == 0:
+                    costs = current
+                break
+            depth, costs = d, current
+            order.sort(key=lambda i: costs[i], reverse=True)
+
+        moves = [Move(moves[i].figure, moves[i].to, cost=costs[i]) for i in sorted(costs)]
+        best = random.choice(get_all_items_with_highest_value(list(moves), 3)) if moves else None
+        return SearchResult(best, moves, depth, self.nodes, monotonic() - start)
@@ -0,0 +1,121 @@
+from typing import Optional
+
+from console_chess_imandyr.figures import Pawn, King
+
+from board import CompactBoard, black_flag, first_move_flag, piece_codes
+from book import castling_rights
+from notation import chess_set_to_fen, to_square
+from parsing_functions import ChessSetBot
+from search import SearchState
+
+
+pawn_code, king_code = piece_codes[Pawn], piece_codes[King]
+rook_squares = {(7, 7): "K", (7, 0): "Q", (0, 7): "k", (0, 0): "q"}
+
+
+def _plain(board: CompactBoard) -> bytes:
+    """ Board bytes without first move flags, which parsers can only guess. """
+    return bytes(code & ~first_move_flag for code in board.squares)
+
+
+class GameSession:
+    def __init__(self) -> None:
+        """
+        State of one game, which is kept between parses of its consecutive positions.
+
+        Every new position is compared with the previous one to find the move made between them.
+        Found moves are recorded to the history, castling and en passant rights and first move flags of pawns
+        are carried forward, and search heuristics in .state stay warm for the next search.
+        When no single move leads to the new position (a new game or missed moves), the session starts again
+        from that position.
+        """
+        self.state = SearchState()
+        self.board: Optional[CompactBoard] = None
+        self.history: list[tuple[tuple[int, int], tuple[int, int]]] = []
+        self.castling = "-"
+        self.en_passant: Optional[tuple[int, int]] = None
+        self.goes_up: Optional[bool] = None
+
+    def _start(self, chess_set: ChessSetBot, board: CompactBoard) -> None:
+        """ Starts the session again from a position with rights guessed from it. """
+        self.state, self.board, self.history = SearchState(), board, []
+        self.castling, self.en_passant, self.goes_up = castling_rights(chess_set), None, None
+
+    @staticmethod
+    def _after(board: CompactBoard, _from: tuple[int, int], to: tuple[int, int], promoted: int) -> CompactBoard:
+        """ Returns a copy of the board after a move, including castling, en passant and promotion. """
+        code, after = board[_from] & 7, board.copy()
+        if code == king_code and abs(to[1] - _from[1]) == 2:
+            rook = (to[0], 7 if to[1] > _from[1] else 0)
+            after.move(rook, (to[0], (to[1] + _from[1]) // 2))
+        elif code == pawn_code and to[1] != _from[1] and not board[to]:
+            after[(_from[0], to[1])] = 0
+        after.move(_from, to)
+        if code == pawn_code and to[0] in {0, 7}:
+            after[to] = promoted
+        return after
+
+    def _find_move(self, board: CompactBoard) -> Optional[tuple[tuple[int, int], tuple[int, int], CompactBoard]]:
+        """ Finds the only move which changes the previous board into a given one. """
+        target, changed = _plain(board), self.board.changed(board)
+        for _from in changed:
+            code = self.board[_from]
+            if not code or board[_from] & ~first_move_flag:
+                continue
+            for to in changed:
+                if to != _from and board[to] and board[to] & black_flag == code & black_flag:
+                    after = self._after(self.board, _from, to, board[to])
+                    if _plain(after) == target:
+                        return _from, to, after
+        return None
+
+    def update(self, chess_set: ChessSetBot) -> Optional[tuple[tuple[int, int], tuple[int, int]]]:
+        """
+        Updates the session with a new position of the game and sets first move flags of its pawns
+        from the game history. Cached moves of the changed pawns and both bots are reset.
+        :param chess_set: Parsed position.
+        :return: Move made since the previous position or None if it was not found.
+        """
+        board = CompactBoard.from_table(chess_set.table)
+        found = None
+        if self.board is None:
+            self._start(chess_set, board)
+        elif _plain(board) != _plain(self.board) and (found := self._find_move(board)) is None:
+            self._start(chess_set, board)
+        elif found is not None:
+            (_from, to, after), moved = found, self.board[found[0]]
+            rights = "kq" if moved & black_flag else "KQ"
+            self.castling = "".join(c for c in self.castling if not (moved & 7 == king_code and c in rights)
+                                    and c not in (rook_squares.get(_from), rook_squares.get(to))) or "-"
+            double_step = moved & 7 == pawn_code and abs(to[0] - _from[0]) == 2
+            self.en_passant = ((_from[0] + to[0]) // 2, _from[1]) if double_step else None
+            self.board, self.goes_up = after, bool(moved & black_flag)
+            self.history.append((_from, to))
+
+        changed = False
+        for f in chess_set.table.figures:
+            if isinstance(f, Pawn) and f.first_move != bool(self.board[f.position] & first_move_flag):
+                f.first_move = not f.first_move
+                f.reset()
+                changed = True
+        if changed:
+            chess_set.player_white.reset()
+            chess_set.player_black.reset()
+        return found[:2] if found else None
+
+    def rights(self, chess_set: ChessSetBot, goes_up: bool) -> Optional[tuple[str, str]]:
+        """
+        Returns FEN castling and en passant fields of a position for the player who goes up or down,
+        or None if the position is not the current position of the session. En passant square is given only
+        to the player who moves next.
+        """
+        if self.board is None or _plain(CompactBoard.from_table(chess_set.table)) != _plain(self.board):
+            return None
+        en_passant = to_square(self.en_passant) if self.en_passant and self.goes_up == goes_up else "-"
+        return self.castling, en_passant
+
+    def fen(self, chess_set: ChessSetBot) -> str:
+        """ Returns full FEN of a position with the rights tracked by the session. White moves if not known. """
+        en_passant = to_square(self.en_passant) if self.en_passant else "-"
+        return f"{chess_set_to_fen(chess_set, self.goes_up is not False)} {self.castling} {en_passant} " \
+               f"0 {len(self.history) // 2 + 1}"
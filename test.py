@@ -1,10 +1,67 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
 import pytest
+from selenium.common import WebDriverException
 from console_chess_imandyr.bot import Move
 from console_chess_imandyr.base import Table, Player
-from console_chess_imandyr.figures import Queen, Pawn
+from console_chess_imandyr.figures import Queen, Pawn, King
 
-from parsing_functions import to_chess_com, tune_pawns
+from parsing_functions import (to_chess_com, tune_pawns, ChessComTableParser, chess_com_snapshot_parse,
+                               ChessNotFound, BoardWatcher, chess_com_universal_parser)
 from player import chess_com_hint_square, chess_com_element
+from parsing import ChessParser, analyse, truncate_moves, MoveSelector
+from board import CompactBoard
+from search import TimedSearch, SearchState
+from move_cache import MoveCostCache, zobrist_hash
+from evaluation import MoveEvaluator
+from notation import fen_to_chess_set, chess_set_to_fen, read_pgn, replay, start_fen
+from main_batch import run as run_batch
+from main_analyse import run as run_analyse
+import benchmark
+from analysis_server import AnalysisServer
+from driver_pool import DriverPool
+from book import MappedTable, PolyglotBook, polyglot_key
+from session import GameSession
+import attacks
+import differential
+from position_store import PositionStore, material_signature, header as position_header
+
+
+class FakeDriver(benchmark.FakeDriver):
+    """ Benchmark WebDriver replacement with a session, which can be opened, authorized and quit. """
+
+    def get(self, url: str) -> None:
+        self.url = url
+
+    @property
+    def current_url(self) -> str:
+        if getattr(self, "dead", False):
+            raise WebDriverException("Session is dead.")
+        return getattr(self, "url", "data:,")
+
+    def get_cookies(self) -> list[dict]:
+        return [{"name": "session", "value": "1"}]
+
+    def add_cookie(self, cookie: dict) -> None:
+        self.cookies = [cookie]
+
+    def quit(self) -> None:
+        self.dead = True
+
+
+start_classes = [f"piece {color}{piece} square-{column}{row}"
+                 for color, rows in (("w", (1, 2)), ("b", (8, 7)))
+                 for row, pieces in zip(rows, ("rnbqkbnr", "p" * 8))
+                 for column, piece in enumerate(pieces, 1)]
+board_classes = ["piece wk square-51", "piece bk square-58", "piece wp square-22", "piece bq square-44", "coordinates"]
 
 
 @pytest.fixture
@@ -16,10 +73,15 @@ def table_player_queen() -> tuple[Table, Player, Queen]:
     return t, p, q
 
 
-# def test_truncate_moves() -> None:
-#     fake_moves = [Move(None, None, None, 1)]
-#     t = truncate_moves(fake_moves)
-#     assert t == fake_moves
+def test_truncate_moves() -> None:
+    fake_moves = [Move(None, None, None, 1)]
+    t = truncate_moves(fake_moves)
+    assert t == fake_moves
+    fake_moves = [Move(c, None, None, cost) for c, cost in enumerate([0, 2, -1, 2, 0, -1, 5, 0])]
+    assert [m.figure for m in truncate_moves(fake_moves, 2, 3)] == [6, 1, 7, 2, 5]
+    assert [m.figure for m in truncate_moves(fake_moves, 5, 5)] == [6, 1, 3, 0, 4, 7, 2, 5]
+    assert [m.cost for m in fake_moves] == [0, 2, -1, 2, 0, -1, 5, 0]
+    assert MoveSelector(2, 3).extend(iter(fake_moves)).result() == truncate_moves(fake_moves, 2, 3)
 
 
 def test_to_chess_com() -> None:
@@ -44,3 +106,433 @@ def test_tune_paws() -> None:
     tune_pawns(t)
     assert pa1.first_move and pa2.first_move and not pa3.first_move
 
+
+
+@pytest.mark.parametrize("scripts", [True, False])
+def test_chess_com_table_parser(scripts) -> None:
+    driver = FakeDriver(board_classes, scripts)
+    chess_set = ChessComTableParser("//div", "")(driver)
+    assert isinstance(chess_set.table.get_figure((7, 4)), King)
+    assert chess_set.table.get_figure((7, 4)).player is chess_set.player_white
+    assert isinstance(chess_set.table.get_figure((4, 3)), Queen)
+    assert chess_set.table.get_figure((6, 1)).first_move
+    assert len(chess_set.table.figures) == 4
+    assert driver.calls == (1 if scripts else 2)
+
+
+def test_move_cost_cache(tmp_path) -> None:
+    path = str(tmp_path / "cache.pickle")
+    cache = MoveCostCache(maxsize=1, path=path)
+    chess_set = ChessComTableParser("//div", "")(FakeDriver(board_classes))
+    moves = [(m.figure.position, m.to, m.cost) for m in cache.moves_costs(chess_set.player_white)]
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    chess_set = ChessComTableParser("//div", "")(FakeDriver(board_classes))
+    cached = cache.moves_costs(chess_set.player_white)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert [(m.figure.position, m.to, m.cost) for m in cached] == moves
+    assert chess_set.player_white.available_moves_costs is cached
+    assert zobrist_hash(chess_set.table, True) != zobrist_hash(chess_set.table, False)
+
+    cache.moves_costs(chess_set.player_black)
+    assert len(cache) == 1
+    cache.save()
+    assert len(MoveCostCache(path=path)) == 1
+
+    # Parsers in different threads share one cache, which evicts keys read by other threads.
+    shared = MoveCostCache(maxsize=4)
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda i: [shared.put(j % 7, []) or shared.get((j + i) % 7) for j in range(5000)],
+                          range(4)))
+    assert len(shared) == 4
+
+
+def costs(chess_set) -> list:
+    return [[(m.figure.position, m.to, m.cost) for m in bot.available_moves_costs]
+            for bot in (chess_set.player_white, chess_set.player_black)]
+
+
+def test_chess_com_table_parser_incremental() -> None:
+    driver, parser = FakeDriver(start_classes), ChessComTableParser("//div", "")
+    first = parser(driver)
+    assert costs(first) == costs(ChessComTableParser("//div", "", incremental=False)(driver))
+    knight = first.table.get_figure((7, 1))
+    knight_moves = knight.available_moves
+    # Another board parsed by the same parser between parses of the first one.
+    other_driver = FakeDriver(board_classes)
+    other_set = parser(other_driver)
+
+    # 1. e4 d5 2. exd5
+    for old, new in (("wp square-52", "wp square-54"), ("bp square-47", "bp square-45"),
+                     ("wp square-54", "wp square-45")):
+        driver.class_names = [i for i in driver.class_names if not i.endswith(new[3:]) and not i.endswith(old)]
+        driver.class_names.append(f"piece {new}")
+        other = parser(FakeDriver(board_classes))
+        chess_set = parser(driver)
+        assert chess_set is first and other is not first and parser(other_driver) is other_set
+        assert costs(chess_set) == costs(ChessComTableParser("//div", "", incremental=False)(driver))
+    assert knight.available_moves is knight_moves
+    assert len(first.table.figures) == 31
+    assert set(first.timings) == {"driver", "board"}
+
+
+@pytest.mark.parametrize("executor", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_move_evaluator(executor) -> None:
+    expected = costs(ChessComTableParser("//div", "")(FakeDriver(start_classes + board_classes[3:4])))
+    chess_set = ChessComTableParser("//div", "")(FakeDriver(start_classes + board_classes[3:4]))
+    with executor(2) as pool:
+        MoveEvaluator(pool, chunks=3).moves_costs([chess_set.player_white, chess_set.player_black])
+    assert costs(chess_set) == expected
+
+
+def test_chess_com_snapshot_parse() -> None:
+    html = "".join(f'<div class="{i}" style="">' for i in board_classes)
+    assert costs(chess_com_snapshot_parse(html)) == costs(chess_com_snapshot_parse(board_classes))
+    assert costs(chess_com_snapshot_parse(html)) == costs(ChessComTableParser("//div", "")(FakeDriver(board_classes)))
+    with pytest.raises(ChessNotFound):
+        chess_com_snapshot_parse("<div class='coordinates'></div>")
+
+
+def test_replay_pgn() -> None:
+    pgn = io.StringIO('[Event "Test"]\n\n1. e4 d5 2. e5 {comment} f5 3. exf6 (3. d4) Nc6 4. Bb5 Bd7 5. Nf3 Qc8 6. O-O 1-0\n')
+    (tags, moves), = read_pgn(pgn)
+    assert tags == {"Event": "Test"} and len(moves) == 11
+    *_, (ply, san, chess_set, goes_up) = replay(tags, moves)
+    assert (ply, san, goes_up) == (11, "O-O", False)
+    assert chess_set_to_fen(chess_set, goes_up) == "r1q1kbnr/pppbp1pp/2n2P2/1B1p4/8/5N2/PPPP1PPP/RNBQ1RK1 b"
+    assert chess_set_to_fen(fen_to_chess_set(start_fen)[0]) == start_fen.rsplit(" ", 4)[0]
+
+
+def test_run_batch() -> None:
+    output = io.StringIO()
+    run_batch(io.StringIO(f"{start_fen}\nbad\n"), output, workers=2)
+    first, second = map(json.loads, output.getvalue().splitlines())
+    assert first == {"fen": start_fen, **analyse(fen_to_chess_set(start_fen)[0])}
+    assert "error" in second
+
+
+def test_compact_board() -> None:
+    chess_set = ChessComTableParser("//div", "")(FakeDriver(start_classes))
+    assert not chess_set.materialized
+    board = CompactBoard.from_table(chess_set.table)
+    assert chess_set.materialized and board == chess_set.board
+    assert board[(6, 0)] == 1 | 16 and board[(0, 4)] == 6 | 8
+    assert bytes(CompactBoard(bytes(board))) == bytes(board)
+    other = board.copy()
+    assert board.changed(other) == []
+    other[(4, 4)] = 1
+    assert board.changed(other) == [(4, 4)]
+
+
+def test_timed_search() -> None:
+    chess_set = chess_com_snapshot_parse(board_classes)
+    expected = costs(chess_com_snapshot_parse(board_classes))[0]
+    result = TimedSearch(60, max_depth=1)(chess_set.player_white)
+    assert [(m.figure.position, m.to, m.cost) for m in result.moves] == expected
+    assert result.depth == 1 and result.move.cost == max(cost for *_, cost in expected)
+
+    state = SearchState()
+    result = TimedSearch(60, max_depth=3, state=state)(chess_set.player_white)
+    assert result.depth == 3 and result.nodes > len(expected) and state.history
+    assert TimedSearch(0)(chess_set.player_white).depth == 0
+    parser = ChessParser(driver=FakeDriver([]), max_depth=1)
+    with pytest.raises(ValueError):
+        parser.search(chess_set.player_white)
+    assert parser.search(chess_set.player_white, 60).depth == 1
+
+
+def test_benchmark(tmp_path) -> None:
+    history = str(tmp_path / "benchmarks.jsonl")
+    for _ in range(2):
+        result = benchmark.run(2, ["parse_bulk", "truncate_moves"], history, benchmark.corpus[-2:])
+    assert set(result["stages"]) == {"parse_bulk", "truncate_moves"}
+    assert result["stages"]["parse_bulk"]["samples"] == 4
+    with open(history) as file:
+        assert len(file.readlines()) == 2
+
+
+def test_chess_parser_metrics(capsys) -> None:
+    metrics = []
+    parser = ChessParser(driver=FakeDriver(board_classes), parse_func=ChessComTableParser("//div", ""),
+                         cache=MoveCostCache(), metrics=metrics.append)
+    parser.parse()
+    parser.parse()
+    assert capsys.readouterr().out.count("White's moves costs") == 2
+    assert metrics[0]["nodes"] > 0 and metrics[0]["cache"]["misses"] == 2
+    assert metrics[1]["nodes"] == 0 and metrics[1]["cache"]["hit_rate"] == 1
+    assert {"parse", "driver", "board", "table", "evaluate", "output", "total"} <= set(metrics[1]["stages"])
+    assert parser.last_metrics is metrics[1]
+
+    parser = ChessParser(driver=FakeDriver(board_classes), parse_func=chess_com_universal_parser,
+                         metrics=metrics.append)
+    parser.parse()
+    assert {"parse", "driver", "board"} <= set(metrics[-1]["stages"])
+
+
+def test_analysis_server() -> None:
+    async def session() -> list[dict]:
+        analysis_server = AnalysisServer(ThreadPoolExecutor(2), workers=2)
+        server = await analysis_server.start(port=0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        responses = []
+        for line in (start_fen, '{"fen": "bad"}', "{", "x" * 100000, start_fen):
+            writer.write(f"{line}\n".encode())
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        server.close()
+        await analysis_server.stop()
+        return responses
+
+    first, second, third, oversized, last = asyncio.run(session())
+    assert first == last == {"fen": start_fen, **analyse(fen_to_chess_set(start_fen)[0])}
+    assert "error" in second and "error" in third and oversized == {"error": "Invalid request."}
+
+
+def test_driver_pool(capsys) -> None:
+    started, authorized = [], []
+    pool = DriverPool(2, lambda: started.append(FakeDriver(board_classes)) or started[-1])
+    parser = ChessParser("https://a/", parse_func=ChessComTableParser("//div", ""), pool=pool,
+                         authorization=authorized.append)
+    assert not started
+    parser.parse()
+    assert len(started) == 1 and authorized == started and started[0].url == "https://a/"
+
+    second = pool.acquire("https://b/", authorized.append)
+    assert len(started) == 2 and len(authorized) == 1 and second.cookies == started[0].get_cookies()
+    parser.release()
+    pool.release(second)
+    started[0].dead = True
+    assert pool.acquire() is second
+    assert pool.acquire("https://c/") is started[2] and len(pool) == 2
+
+    def fail(driver: FakeDriver) -> None:
+        raise WebDriverException("No login form.")
+
+    pool = DriverPool(1, lambda: started.append(FakeDriver(board_classes)) or started[-1])
+    with pytest.raises(WebDriverException):
+        pool.acquire("https://d/", fail)
+    assert len(pool) == 0 and started[-1].dead
+    assert pool.acquire("https://d/") is started[-1] and len(pool) == 1
+
+
+def test_board_watcher() -> None:
+    class VersionDriver(FakeDriver):
+        version = "a:0"
+
+        def execute_script(self, script: str, *args) -> str:
+            self.calls += 1
+            return self.version
+
+    driver, watcher = VersionDriver(board_classes), BoardWatcher(["//div"])
+    assert watcher.changed(driver) and not watcher.changed(driver)
+    driver.version = "a:1"
+    assert watcher.changed(driver) and not watcher.changed(driver)
+    driver.version = None
+    assert not watcher.changed(driver) and not watcher.changed(driver)
+    driver.version = "b:0"
+    assert watcher.changed(driver) and not watcher.changed(driver)
+    assert watcher.changed(FakeDriver(board_classes, scripts=False))
+    assert driver.calls == 8
+
+    active, overlaps, parse = [0], [0], ChessComTableParser("//div", "")
+
+    def slow_parse(driver: FakeDriver):
+        active[0] += 1
+        overlaps[0] = max(overlaps[0], active[0])
+        time.sleep(0.01)
+        active[0] -= 1
+        return parse(driver)
+
+    parser = ChessParser(driver=FakeDriver(board_classes), parse_func=slow_parse,
+                         evaluator=attacks.TableEvaluator(None))
+    always = BoardWatcher([])
+    always.changed = lambda driver: True
+    threads = [threading.Thread(target=lambda: [parser.parse_if_changed(always) for i in range(3)]) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for i in range(3):
+        parser.parse()
+    for thread in threads:
+        thread.join()
+    assert overlaps[0] == 1
+
+
+def test_books(tmp_path, capsys) -> None:
+    chess = pytest.importorskip("chess")
+    import chess.polyglot
+    chess_set = fen_to_chess_set(start_fen)[0]
+    assert polyglot_key(chess_set, True) == 0x463b96181691fc9c
+    path = str(tmp_path / "book.bin")
+    e2e4, g1f3 = (1 << 9) | (4 << 6) | (3 << 3) | 4, (0 << 9) | (6 << 6) | (2 << 3) | 5
+    d2d4 = (1 << 9) | (3 << 6) | (3 << 3) | 3
+    with open(path, "wb") as file:
+        for move, weight in ((g1f3, 5), (e2e4, 10), (d2d4, 0)):
+            file.write(PolyglotBook.record.pack(0x463b96181691fc9c, move, weight, 0))
+    book = PolyglotBook(path)
+    moves = book.lookup(chess_set.player_white)
+    assert [(m.figure.position, m.to, m.cost) for m in moves] == [((6, 4), (4, 4), 0), ((7, 6), (5, 5), 0)]
+    assert chess_set.player_white.available_moves_costs is moves
+    assert book.lookup(chess_set.player_black) is None
+    with pytest.raises(TypeError):
+        MappedTable(path)
+
+    ChessParser(driver=FakeDriver([]), n_best=1, n_worst=1, books=[book]).print_analysis(
+        fen_to_chess_set(start_fen)[0])
+    white, black = capsys.readouterr().out.splitlines()
+    assert white.startswith("White's book moves: ") and white.count("==") == 2 and "== 0" in white
+    assert black.startswith("Black's moves costs: ")
+
+    parser = ChessParser(driver=FakeDriver([]), books=[book])
+    chess_set = fen_to_chess_set(benchmark.corpus[-1])[0]
+    assert [[(m.figure.position, m.to, m.cost) for m in moves]
+            for moves in parser.moves_costs(chess_set.player_white, chess_set.player_black)] == \
+           costs(fen_to_chess_set(benchmark.corpus[-1])[0])
+    assert parser.nodes > 0 and parser.last_sources == [None, None]
+
+    (tmp_path / "empty.bin").touch()
+    assert len(PolyglotBook(str(tmp_path / "empty.bin"))) == 0
+
+    # Kings went out and back, so castling rights can't be guessed from figures, and en passant is possible.
+    game = "1. e4 e5 2. Ke2 Ke7 3. Ke1 Ke8 4. d4 Nf6 5. d5 c5 *\n"
+    board = chess.Board()
+    for san in "e4 e5 Ke2 Ke7 Ke1 Ke8 d4 Nf6 d5 c5".split():
+        board.push_san(san)
+    path = str(tmp_path / "session.bin")
+    with open(path, "wb") as file:
+        file.write(PolyglotBook.record.pack(chess.polyglot.zobrist_hash(board), g1f3, 1, 0))
+    session = GameSession()
+    for *_, chess_set, goes_up in replay(*next(read_pgn(io.StringIO(game)))):
+        session.update(chess_set)
+    assert session.rights(chess_set, True) == ("-", "c6") and session.rights(chess_set, False) == ("-", "-")
+    assert PolyglotBook(path).lookup(chess_set.player_white) is None
+    parser = ChessParser(driver=FakeDriver([]), books=[PolyglotBook(path)], session=session)
+    assert parser.moves_costs(chess_set.player_white)[0] and parser.last_sources[0] is parser.books[0]
+
+
+def test_game_session() -> None:
+    pgn = io.StringIO("1. e4 d5 2. e5 f5 3. exf6 Nc6 4. Bb5 Bd7 5. Nf3 Qc8 6. O-O 1-0\n")
+    session, found = GameSession(), []
+    for ply, san, chess_set, goes_up in replay(*next(read_pgn(pgn))):
+        found.append(session.update(chess_set))
+        assert session.goes_up in {goes_up, None}
+        if san == "f5":
+            assert session.en_passant == (2, 5)
+    assert found[0] is None and None not in found[1:]
+    assert found[5] == ((3, 4), (2, 5)) and found[-1] == ((7, 4), (7, 6)) and session.history == found[1:]
+    assert session.fen(chess_set) == "r1q1kbnr/pppbp1pp/2n2P2/1B1p4/8/5N2/PPPP1PPP/RNBQ1RK1 b kq - 0 6"
+
+    state = session.state
+    assert session.update(chess_set) is None and session.state is state
+    assert session.update(fen_to_chess_set(start_fen)[0]) is None
+    assert session.history == [] and session.castling == "KQkq" and session.state is not state
+
+    parser = ChessParser(driver=FakeDriver(board_classes), parse_func=ChessComTableParser("//div", ""),
+                         session=session, max_depth=3)
+    parser.search(parser.use_parse_func().player_white, 60)
+    assert session.board == CompactBoard.from_table(chess_com_snapshot_parse(board_classes).table)
+    assert session.state.history
+
+
+def test_position_store(tmp_path) -> None:
+    path = str(tmp_path / "positions.bin")
+    store = PositionStore(path)
+    pgn = "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Bxc6 dxc6 1-0\n"
+    first, second = io.StringIO(), io.StringIO()
+    run_batch(io.StringIO(pgn), first, store=store)
+    assert len(store) == 18 and store.signatures()["KQRRBBNNPPPPPPPPvKQRRBBNNPPPPPPPP"] == 14
+    store.close()
+
+    with open(path, "ab") as file:
+        file.write(b"partial")
+    size = os.path.getsize(path)
+    reader = PositionStore(path, read_only=True)
+    assert len(reader) == 18 and os.path.getsize(path) == size
+    with pytest.raises(ValueError):
+        reader.put(CompactBoard(), True, [])
+    reader.close()
+    store = PositionStore(path)
+    assert len(store) == 18 and os.path.getsize(path) == size - len(b"partial")
+    run_batch(io.StringIO(pgn), second, store=store, workers=2)
+    assert first.getvalue() == second.getvalue() and len(store) == 18
+
+    chess_set = fen_to_chess_set(start_fen)[0]
+    parser = ChessParser(driver=FakeDriver([]), store=store)
+    assert costs(chess_set)[0] == [(m.figure.position, m.to, m.cost)
+                                   for m in parser.moves_costs(fen_to_chess_set(start_fen)[0].player_white)[0]]
+    assert parser.nodes == 0 and store.hits == 1
+    white, black = store.positions("KQRRBNNPPPPPPPPvKQRRBBNPPPPPPPP")
+    assert material_signature(white.board) == "KQRRBNNPPPPPPPPvKQRRBBNPPPPPPPP"
+    assert white.board == black.board and (white.goes_up, black.goes_up) == (True, False)
+
+    bot = fen_to_chess_set(start_fen)[0].player_white
+    key = CompactBoard.from_table(bot.table).zobrist(True)
+    with open(tmp_path / "collided.bin", "wb") as file:
+        file.write(position_header.pack(key, bytes(CompactBoard()), True, 0))
+    collided = PositionStore(str(tmp_path / "collided.bin"))
+    assert key in collided and collided.lookup(bot) is None and collided.misses == 1
+    collided.close()
+
+
+def test_batch_evaluation() -> None:
+    pytest.importorskip("numpy")
+    import batch_evaluation
+    boards = [CompactBoard.from_table(fen_to_chess_set(fen)[0].table) for fen in benchmark.corpus]
+    goes_up = [fen_to_chess_set(fen)[1] for fen in benchmark.corpus]
+    scores = batch_evaluation.evaluate_batch(boards, goes_up)
+    assert scores.tolist() == pytest.approx([batch_evaluation.evaluate(b, g) for b, g in zip(boards, goes_up)])
+    assert scores[0] == 0 and batch_evaluation.evaluate_batch(boards[-1:], False)[0] < 0
+    assert batch_evaluation.rank(boards, goes_up, limit=2) == sorted(range(len(boards)), key=lambda i: -scores[i])[:2]
+
+
+def test_headless_analysis(capsys) -> None:
+    modules = subprocess.run([sys.executable, "-c", "import sys, main_analyse, main_parse, main_play; "
+                              "print(any(m.startswith(('pynput', 'selenium.webdriver.remote')) for m in sys.modules))"],
+                             capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert modules.strip() == "False"
+
+    chess_set = fen_to_chess_set(start_fen)[0]
+    assert run_analyse([start_fen, "bad"]) == 1
+    output = capsys.readouterr()
+    assert output.out.splitlines() == [f"White's moves costs: {analyse(chess_set)['white']}",
+                                       f"Black's moves costs: {analyse(chess_set)['black']}"]
+    assert "Invalid FEN" in output.err
+
+
+def test_attack_tables() -> None:
+    pgn = io.StringIO("1. e4 d5 2. e5 f5 3. exf6 Nc6 4. Bb5 Bd7 5. Nf3 Qc8 6. O-O 1-0\n")
+    chess_sets = [fen_to_chess_set(fen)[0] for fen in benchmark.corpus] + \
+                 [chess_set for *_, chess_set, goes_up in replay(*next(read_pgn(pgn)))]
+    for chess_set in chess_sets:
+        board = CompactBoard.from_table(chess_set.table)
+        for f in chess_set.table.figures:
+            square = f.position[0] * 8 + f.position[1]
+            assert list(attacks.figure_moves(board.squares, square)) == list(f.available_moves)
+        assert [attacks.moves_costs(board, goes_up, None) for goes_up in (True, False)] == costs(chess_set)
+
+    cache = MoveCostCache()
+    parser = ChessParser(driver=FakeDriver(board_classes), parse_func=ChessComTableParser("//div", ""),
+                         evaluator=attacks.TableEvaluator(cache))
+    chess_set = parser.use_parse_func()
+    moves = parser.moves_costs(chess_set.player_white, chess_set.player_black)
+    expected = costs(chess_com_snapshot_parse(board_classes))
+    assert [[(m.figure.position, m.to, m.cost) for m in i] for i in moves] == expected and len(cache) == 2
+
+    chess_set = chess_com_snapshot_parse(board_classes)
+    moves = chess_set.moves_costs(False)
+    assert [(m.figure.position, m.to, m.cost) for m in moves] == expected[1]
+    assert chess_set.player_black.available_moves_costs is moves
+
+
+def test_differential(capsys) -> None:
+    positions = differential.default_corpus()[-12:]
+    results = differential.run(positions, ["tables", "incremental:tables", "snapshot", "search"], verbose=False)
+    assert list(results["modes"]) == ["tables", "incremental:tables", "snapshot", "search"]
+    assert all(not i["mismatches"] and len(i["speedup"]) == len(positions) for i in results["modes"].values())
+    assert "mismatches 0/12" in capsys.readouterr().out
+
+    results = differential.run(positions[:2], ["tables"], n_best=1, n_worst=0, verbose=False, strict=False)
+    assert not results["modes"]["tables"]["mismatches"]
+    with pytest.raises(ValueError):
+        differential.create_mode("bulk:unknown")